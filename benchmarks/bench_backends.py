@@ -0,0 +1,101 @@
+"""
+Compare the parser backends of i3d_mapper on the same corpus.
+
+Every available backend parses and serializes the same vehicle XMLs and
+parses and scans the same i3ds; the best of --repeat runs is reported per
+stage. Backends that are not installed are skipped.
+
+    python benchmarks/bench_backends.py <mod folder or files> [--repeat N] [--json out.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import i3d_mapper  # noqa: E402
+
+
+def collect_corpus(paths):
+    """Return (xml_files, i3d_files) found in paths, which may be files or folders."""
+    xml_files, i3d_files = [], []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = (
+                os.path.join(dirpath, name)
+                for dirpath, _, filenames in os.walk(path)
+                for name in sorted(filenames)
+            )
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            lower = candidate.lower()
+            if lower.endswith(".xml"):
+                xml_files.append(candidate)
+            elif lower.endswith(".i3d"):
+                i3d_files.append(candidate)
+    return xml_files, i3d_files
+
+
+def best_time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scan_i3ds(i3d_files, backend):
+    logger = i3d_mapper.RecordingLogger()
+    for path in i3d_files:
+        with open(path, "rb") as i3d_file:
+            i3d_mapper.generate_i3d_mapping(i3d_file, logger, backend=backend)
+
+
+def bench_backend(backend, xml_files, i3d_files, repeat: int):
+    """Return {stage: seconds} for one backend."""
+    trees = [backend.parse_file(path) for path in xml_files]
+    return {
+        "parse_xml": best_time(lambda: [backend.parse_file(path) for path in xml_files], repeat),
+        "serialize_xml": best_time(lambda: [i3d_mapper.serialize_vehicle_xml(tree) for tree in trees], repeat),
+        "parse_i3d": best_time(lambda: [backend.parse_file(path) for path in i3d_files], repeat),
+        "scan_i3d": best_time(lambda: scan_i3ds(i3d_files, backend), repeat),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare i3d_mapper parser backends on a corpus of mods.")
+    parser.add_argument("paths", nargs="+", help="mod folders, vehicle XMLs or i3d files")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per stage; the best one is reported")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to a JSON file")
+    args = parser.parse_args(argv)
+
+    xml_files, i3d_files = collect_corpus(args.paths)
+    corpus_bytes = sum(os.path.getsize(path) for path in xml_files + i3d_files)
+    print(f"Corpus: {len(xml_files)} XML file(s), {len(i3d_files)} i3d file(s), {corpus_bytes / 1e6:.1f} MB")
+
+    results = {}
+    for name in i3d_mapper.BACKEND_CLASSES:
+        try:
+            backend = i3d_mapper.get_backend(name)
+        except ImportError:
+            print(f"{name}: not installed, skipped")
+            continue
+        results[name] = bench_backend(backend, xml_files, i3d_files, args.repeat)
+
+    stages = ["parse_xml", "serialize_xml", "parse_i3d", "scan_i3d"]
+    print(f"{'stage':<15}" + "".join(f"{name:>12}" for name in results))
+    for stage in stages:
+        print(f"{stage:<15}" + "".join(f"{results[name][stage] * 1000:>10.1f}ms" for name in results))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as writer:
+            json.dump({"corpus_bytes": corpus_bytes, "repeat": args.repeat, "results": results}, writer, indent=2)
+
+
+if __name__ == "__main__":
+    main()
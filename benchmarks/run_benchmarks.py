@@ -0,0 +1,206 @@
+"""
+Time every pipeline stage of i3d_mapper on generated mods and catch regressions.
+
+For each mod size the suite measures:
+- generate_i3d_mapping
+- the numeric reference rewrite
+- the memory tag cleanup
+- serialization
+- a full process_moddesc run
+
+Each stage reports its best wall time over --repeat runs. A separate
+run under tracemalloc records its peak memory. Results are written as JSON.
+With a baseline, the exit status is 1 when a stage got slower or hungrier
+than the baseline by more than --threshold percent.
+
+    python benchmarks/run_benchmarks.py [--sizes small medium huge] [--save-baseline]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import i3d_mapper  # noqa: E402
+from synthetic import SceneSpec, VehicleSpec, generate_mod  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_RESULTS = os.path.join(BENCH_DIR, "results.json")
+
+SIZES = {
+    "small": dict(
+        scene=SceneSpec(nodes=1_000, components=2, max_depth=6),
+        vehicle=VehicleSpec(references=200),
+        vehicles=2, i3ds=1,
+    ),
+    "medium": dict(
+        scene=SceneSpec(nodes=20_000, components=4, max_depth=10, shapes_bytes=1 << 20),
+        vehicle=VehicleSpec(references=2_000),
+        vehicles=4, i3ds=2,
+    ),
+    "huge": dict(
+        scene=SceneSpec(nodes=200_000, components=8, max_depth=14, fan_out=8, shapes_bytes=16 << 20),
+        vehicle=VehicleSpec(references=20_000),
+        vehicles=4, i3ds=1,
+    ),
+}
+
+STAGES = ["generate_i3d_mapping", "rewrite_references", "remove_memory_tags", "serialize", "process_moddesc"]
+
+
+def measure(setup, func, repeat: int):
+    """
+    Return (best_seconds, peak_bytes) of func(setup()).
+
+    setup() runs outside the measurement before every call; peak memory
+    comes from one extra traced call, so tracing does not skew the timing.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        func(state)
+        best = min(best, time.perf_counter() - start)
+
+    state = setup()
+    tracemalloc.start()
+    try:
+        func(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def bench_size(size: str, work_dir: str, repeat: int, backend):
+    """Generate the mod of one size and return {stage: {"seconds", "peak_bytes"}}."""
+    preset = SIZES[size]
+    source_dir = os.path.join(work_dir, f"{size}-source")
+    moddesc_path = generate_mod(source_dir, preset["scene"], preset["vehicle"], preset["vehicles"], preset["i3ds"])
+    i3d_path = os.path.join(source_dir, "i3d", "vehicle0.i3d")
+    xml_path = os.path.join(source_dir, "xml", "vehicle0.xml")
+    logger = i3d_mapper.Logger(quiet=True)
+
+    with open(i3d_path, "rb") as i3d_file:
+        mapping = i3d_mapper.generate_i3d_mapping(i3d_file, logger, backend=backend)
+
+    def open_i3d():
+        return open(i3d_path, "rb")
+
+    def scan(i3d_file):
+        with i3d_file:
+            i3d_mapper.generate_i3d_mapping(i3d_file, logger, backend=backend)
+
+    def parsed_xml():
+        return backend.parse_file(xml_path)
+
+    def mapped_xml():
+        shop_xml = backend.parse_file(xml_path)
+        i3d_mapper.apply_i3d_mapping(shop_xml, mapping, logger)
+        return shop_xml
+
+    def fresh_mod():
+        run_dir = os.path.join(work_dir, f"{size}-run")
+        shutil.rmtree(run_dir, ignore_errors=True)
+        shutil.copytree(source_dir, run_dir)
+        return os.path.join(run_dir, os.path.basename(moddesc_path))
+
+    stages = {
+        "generate_i3d_mapping": (open_i3d, scan),
+        "rewrite_references": (parsed_xml, lambda shop_xml: i3d_mapper.replace_node_references(shop_xml, mapping.node_to_id)),
+        "remove_memory_tags": (parsed_xml, lambda shop_xml: i3d_mapper.remove_tags(shop_xml, i3d_mapper.MEMORY_TAGS)),
+        "serialize": (mapped_xml, i3d_mapper.serialize_vehicle_xml),
+        "process_moddesc": (fresh_mod, lambda path: i3d_mapper.process_moddesc(path, logger, backend=backend)),
+    }
+
+    results = {}
+    for stage in STAGES:
+        seconds, peak = measure(*stages[stage], repeat)
+        results[stage] = {"seconds": seconds, "peak_bytes": peak}
+        print(f"  {stage:<22} {seconds * 1000:>10.2f} ms {peak / 1e6:>10.2f} MB")
+    return results
+
+
+def compare(results, baseline, threshold: float):
+    """Return a list of regression messages for stages beyond threshold percent of the baseline."""
+    regressions = []
+    for size, stages in results.items():
+        for stage, current in stages.items():
+            previous = baseline.get(size, {}).get(stage)
+            if not previous:
+                continue
+            for metric in ("seconds", "peak_bytes"):
+                if previous.get(metric, 0) <= 0:
+                    continue
+                change = (current[metric] / previous[metric] - 1) * 100
+                if change > threshold:
+                    regressions.append(
+                        f"{size}/{stage}: {metric} {previous[metric]:.6g} -> {current[metric]:.6g} (+{change:.1f}%)"
+                    )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the i3d_mapper pipeline stages on generated mods.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"],
+                        help="mod sizes to run (huge takes a while)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per stage; the best one is kept")
+    parser.add_argument("--backend", choices=["auto", *i3d_mapper.BACKEND_CLASSES], default="stdlib")
+    parser.add_argument("--output", default=DEFAULT_RESULTS, help="JSON file for the results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=20.0,
+                        help="allowed slowdown or memory growth per stage, in percent")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    backend = i3d_mapper.get_backend(args.backend)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="i3dmapper-bench-") as work_dir:
+        for size in args.sizes:
+            print(f"{size}:")
+            results[size] = bench_size(size, work_dir, args.repeat, backend)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": backend.name,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as writer:
+        json.dump(report, writer, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print("No baseline found; run with --save-baseline to create one.")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as reader:
+        baseline = json.load(reader)
+    if baseline.get("backend") != backend.name:
+        print(f"⚠️ Baseline was recorded with the {baseline.get('backend')} backend.")
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print(f"❌ {len(regressions)} stage(s) regressed by more than {args.threshold:g}%:")
+        for message in regressions:
+            print(f"  • {message}")
+        return 1
+    print(f"✅ No stage regressed by more than {args.threshold:g}%.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
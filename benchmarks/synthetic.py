@@ -0,0 +1,291 @@
+"""
+Deterministic synthetic mods for benchmarks and stress tests.
+
+Scenes and vehicle XMLs are generated from a spec and a seed, so the same
+arguments always produce byte-identical files. No real mod content is
+needed to measure the mapper at scale.
+
+    python benchmarks/synthetic.py <out dir> [--nodes N] [--vehicles N] [--i3ds N] ...
+"""
+
+import argparse
+import os
+import random
+import sys
+from dataclasses import dataclass, replace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from i3d_mapper import MEMORY_TAGS, NODE_TYPES  # noqa: E402
+
+DUPLICATE_NAMES = ["Light", "bolt", "wheel", "hose", "decal", "collision", "attacher", "mirror"]
+NODE_TAGS = ["TransformGroup", "TransformGroup", "Shape", "Shape", "Light", "Camera"]
+
+
+@dataclass
+class SceneSpec:
+    """Shape of a generated i3d Scene."""
+    nodes: int = 1000
+    components: int = 2
+    max_depth: int = 8
+    fan_out: int = 6
+    duplicate_ratio: float = 0.2
+    unnamed_ratio: float = 0.02
+    shapes_bytes: int = 0
+    seed: int = 0
+
+
+@dataclass
+class VehicleSpec:
+    """Content of a generated vehicle XML."""
+    references: int = 200
+    memory_tags: int = len(MEMORY_TAGS)
+    seed: int = 0
+
+
+def build_scene(spec: SceneSpec):
+    """
+    Return (parents, names) describing a Scene tree in document order.
+
+    parents[i] is the index of node i's parent (-1 for components) and
+    names[i] its name or None. Nodes are attached to random earlier nodes
+    that are below max_depth and have fewer than fan_out children.
+    """
+    rng = random.Random(spec.seed)
+    components = max(1, min(spec.components, spec.nodes))
+    parents = [-1] * components
+    depths = [0] * components
+    child_counts = [0] * components
+    open_nodes = list(range(components))
+
+    for node in range(components, spec.nodes):
+        while True:
+            slot = rng.randrange(len(open_nodes))
+            parent = open_nodes[slot]
+            if depths[parent] < spec.max_depth and child_counts[parent] < spec.fan_out:
+                break
+            open_nodes[slot] = open_nodes[-1]
+            open_nodes.pop()
+            if not open_nodes:
+                raise ValueError("max_depth and fan_out leave no room for the requested node count")
+        parents.append(parent)
+        depths.append(depths[parent] + 1)
+        child_counts[parent] += 1
+        child_counts.append(0)
+        open_nodes.append(node)
+
+    names = []
+    for node in range(len(parents)):
+        roll = rng.random()
+        if node >= components and roll < spec.unnamed_ratio:
+            names.append(None)
+        elif roll < spec.unnamed_ratio + spec.duplicate_ratio:
+            names.append(rng.choice(DUPLICATE_NAMES))
+        else:
+            names.append(f"node{node:06d}")
+
+    return document_order(parents, names)
+
+
+def document_order(parents, names):
+    """Renumber a tree given in creation order so that nodes are listed depth first."""
+    children = [[] for _ in parents]
+    roots = []
+    for node, parent in enumerate(parents):
+        (children[parent] if parent >= 0 else roots).append(node)
+
+    order = []
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(reversed(children[node]))
+
+    new_index = {old: new for new, old in enumerate(order)}
+    return (
+        [new_index[parents[old]] if parents[old] >= 0 else -1 for old in order],
+        [names[old] for old in order],
+    )
+
+
+def node_paths(parents):
+    """Return the i3dMapping node path ("0>1|2") of every node."""
+    paths = []
+    child_counts = [0] * len(parents)
+    component = -1
+    for node, parent in enumerate(parents):
+        if parent < 0:
+            component += 1
+            paths.append(f"{component}>")
+        else:
+            ordinal = child_counts[parent]
+            child_counts[parent] += 1
+            separator = "" if paths[parent].endswith(">") else "|"
+            paths.append(f"{paths[parent]}{separator}{ordinal}")
+    return paths
+
+
+def shapes_payload(rng, size: int):
+    """Yield lines of an inline <Shapes> block of roughly size bytes."""
+    written = 0
+    shape_id = 0
+    while written < size:
+        shape_id += 1
+        vertices = [
+            f'          <v p="{rng.uniform(-5, 5):.6f} {rng.uniform(-5, 5):.6f} {rng.uniform(-5, 5):.6f}" '
+            f'n="0 1 0" t0="{rng.random():.6f} {rng.random():.6f}"/>'
+            for _ in range(64)
+        ]
+        block = [
+            f'    <IndexedTriangleSet name="shape{shape_id}" shapeId="{shape_id}">',
+            '      <Vertices count="64" normal="true" uv0="true">',
+            *vertices,
+            "      </Vertices>",
+            "    </IndexedTriangleSet>",
+        ]
+        written += sum(len(line) + 1 for line in block)
+        yield from block
+
+
+def generate_i3d(spec: SceneSpec, name: str = "vehicle"):
+    """Return (i3d_bytes, parents, names) for a generated scene."""
+    parents, names = build_scene(spec)
+    rng = random.Random(spec.seed + 1)
+
+    lines = [
+        '<?xml version="1.0" encoding="iso-8859-1"?>',
+        f'<i3D name="{name}" version="1.6">',
+        '  <Asset><Export program="GIANTS Editor 64bit" version="10.0.0"/></Asset>',
+        "  <Files>",
+        '    <File fileId="1" filename="textures/diffuse.dds"/>',
+        "  </Files>",
+        "  <Materials>",
+        '    <Material name="mat" materialId="1" diffuseColor="1 1 1 1"/>',
+        "  </Materials>",
+        "  <Shapes>",
+        *shapes_payload(rng, spec.shapes_bytes),
+        "  </Shapes>",
+        "  <Scene>",
+    ]
+
+    open_stack = []
+    for node, parent in enumerate(parents):
+        while open_stack and open_stack[-1][0] != parent:
+            _, tag = open_stack.pop()
+            lines.append("  " * (len(open_stack) + 2) + f"</{tag}>")
+        tag = NODE_TAGS[rng.randrange(len(NODE_TAGS))] if parent >= 0 else "Shape"
+        name_attr = f' name="{names[node]}"' if names[node] else ""
+        lines.append("  " * (len(open_stack) + 2) + f'<{tag}{name_attr} nodeId="{node + 1}">')
+        open_stack.append((node, tag))
+    while open_stack:
+        _, tag = open_stack.pop()
+        lines.append("  " * (len(open_stack) + 2) + f"</{tag}>")
+
+    lines += ["  </Scene>", "</i3D>", ""]
+    return "\n".join(lines).encode("iso-8859-1"), parents, names
+
+
+def generate_vehicle_xml(i3d_filename: str, parents, spec: VehicleSpec) -> bytes:
+    """
+    Return a vehicle XML for a generated scene.
+
+    It holds spec.references numeric node references spread over the
+    NODE_TYPES attributes and spec.memory_tags memory usage tags.
+    """
+    rng = random.Random(spec.seed)
+    paths = node_paths(parents)
+    components = [path for path in paths if path.endswith(">")]
+
+    lines = [
+        "<?xml version='1.0' encoding='utf-8'?>",
+        '<vehicle type="synthetic">',
+        "    <base>",
+        f"        <filename>{i3d_filename}</filename>",
+        "        <components>",
+        *(f'            <component node="{path}" />' for path in components),
+        "        </components>",
+    ]
+    for number in range(spec.memory_tags):
+        tag = MEMORY_TAGS[number % len(MEMORY_TAGS)]
+        lines.append(f"        <{tag}>{rng.randrange(1 << 20)}</{tag}>")
+    lines.append("    </base>")
+
+    lines.append("    <parts>")
+    for number in range(spec.references):
+        attr_name = NODE_TYPES[number % len(NODE_TYPES)]
+        lines.append(f'        <part id="{number}" {attr_name}="{paths[rng.randrange(len(paths))]}" />')
+    lines += ["    </parts>", "</vehicle>", ""]
+    return "\n".join(lines).encode("utf-8")
+
+
+def generate_mod(root_dir: str, scene: SceneSpec, vehicle: VehicleSpec, vehicles: int = 1, i3ds: int = 1) -> str:
+    """
+    Write a synthetic mod below root_dir and return its modDesc.xml path.
+
+    Vehicles are spread round robin over i3ds generated i3ds; every file
+    gets its own seed derived from the spec seeds.
+    """
+    os.makedirs(os.path.join(root_dir, "i3d"), exist_ok=True)
+    os.makedirs(os.path.join(root_dir, "xml"), exist_ok=True)
+    i3ds = max(1, min(i3ds, vehicles))
+
+    scenes = []
+    for number in range(i3ds):
+        i3d_filename = f"i3d/vehicle{number}.i3d"
+        data, parents, _ = generate_i3d(replace(scene, seed=scene.seed + number), f"vehicle{number}")
+        with open(os.path.join(root_dir, i3d_filename), "wb") as writer:
+            writer.write(data)
+        scenes.append((i3d_filename, parents))
+
+    store_items = []
+    for number in range(vehicles):
+        i3d_filename, parents = scenes[number % i3ds]
+        xml_filename = f"xml/vehicle{number}.xml"
+        data = generate_vehicle_xml(i3d_filename, parents, replace(vehicle, seed=vehicle.seed + number))
+        with open(os.path.join(root_dir, xml_filename), "wb") as writer:
+            writer.write(data)
+        store_items.append(f'        <storeItem xmlFilename="{xml_filename}"/>')
+
+    moddesc_path = os.path.join(root_dir, "modDesc.xml")
+    with open(moddesc_path, "w", encoding="utf-8") as writer:
+        writer.write("\n".join([
+            '<?xml version="1.0" encoding="utf-8" standalone="no" ?>',
+            '<modDesc descVersion="92">',
+            "    <storeItems>",
+            *store_items,
+            "    </storeItems>",
+            "</modDesc>",
+            "",
+        ]))
+    return moddesc_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic mod for benchmarks.")
+    parser.add_argument("out_dir", help="folder to write the mod into")
+    parser.add_argument("--nodes", type=int, default=SceneSpec.nodes, help="nodes per i3d Scene")
+    parser.add_argument("--components", type=int, default=SceneSpec.components)
+    parser.add_argument("--max-depth", type=int, default=SceneSpec.max_depth)
+    parser.add_argument("--fan-out", type=int, default=SceneSpec.fan_out)
+    parser.add_argument("--duplicate-ratio", type=float, default=SceneSpec.duplicate_ratio,
+                        help="share of nodes named from a small pool of repeated names")
+    parser.add_argument("--shapes-bytes", type=int, default=SceneSpec.shapes_bytes,
+                        help="approximate size of the inline <Shapes> payload")
+    parser.add_argument("--references", type=int, default=VehicleSpec.references,
+                        help="numeric node references per vehicle XML")
+    parser.add_argument("--memory-tags", type=int, default=VehicleSpec.memory_tags)
+    parser.add_argument("--vehicles", type=int, default=1)
+    parser.add_argument("--i3ds", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    scene = SceneSpec(
+        nodes=args.nodes, components=args.components, max_depth=args.max_depth, fan_out=args.fan_out,
+        duplicate_ratio=args.duplicate_ratio, shapes_bytes=args.shapes_bytes, seed=args.seed,
+    )
+    vehicle = VehicleSpec(references=args.references, memory_tags=args.memory_tags, seed=args.seed)
+    print(generate_mod(args.out_dir, scene, vehicle, args.vehicles, args.i3ds))
+
+
+if __name__ == "__main__":
+    main()
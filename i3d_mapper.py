@@ -1,8 +1,25 @@
 #!/usr/bin/env python3
 import xml.etree.ElementTree as ET
+import xml.parsers.expat as expat
+import argparse
+from array import array
+import copy
+import hashlib
+import json
+import mmap
 import os
+import posixpath
 import re
+import shutil
+import struct
 import sys
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import threading
+import time
+import tracemalloc
+import zlib
 from datetime import datetime
 
 
@@ -13,10 +30,16 @@ NODE_TYPES = [
     "targetNode", "baseNode", "playerTriggerNode", "vehicleTriggerNode",
     "visibilityNode", "triggerNode", "activeNode", "inactiveNode", "numbers", "realLight"
 ]
+NODE_ATTRIBUTES = frozenset(NODE_TYPES)
 
 XPATH_I3D_MAPPING = ".//i3dMapping"
 XPATH_I3D_MAPPINGS = ".//i3dMappings"
 
+RE_TAG_NAME = re.compile(rb"<[^\s/>]+")
+RE_TAG_ATTRIB = re.compile(rb"""\s*([^\s=/>]+)\s*=\s*(?:"[^"]*"|'[^']*')""")
+RE_NAME_SUFFIX = re.compile(r"^(.*)_(\d{3,})$")
+RE_NODE_PATH = re.compile(r"[0-9]+>(?:[0-9]+(?:\|[0-9]+)*)?")
+
 MEMORY_TAGS = [
     "vertexBufferMemoryUsage",
     "indexBufferMemoryUsage",
@@ -26,53 +49,312 @@ MEMORY_TAGS = [
     "instanceIndexBufferMemoryUsage",
 ]
 
-LOG_FILE_PATH = None
-CURRENT_MOD_ROOT = None
+CACHE_DIR_NAME = ".i3dmapper-cache"
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_MEMORY_ENTRIES = 256
+CACHE_VERSION = 2
+DIGEST_SIZE = 20
+
+SIDECAR_SUFFIX = ".map.json"
+SIDECAR_VERSION = 1
+
+GRAPH_FILE_NAME = "mod-graph.json"
+GRAPH_VERSION = 1
+PLAN_BYTES_PER_SECOND = 20_000_000
+
+ZIP_COPY_CHUNK = 1 << 20
+ZIP_FLAG_ENCRYPTED = 0x01
+ZIP_FLAG_DATA_DESCRIPTOR = 0x08
+ZIP64_EXTRA_ID = 0x0001
 
+LOG_FILE_NAME = "log.txt"
+LOG_BUFFER_SIZE = 1 << 16
+MAX_OPEN_LOGS = 32
 
-def init_logger(mod_root: str):
+PROFILE_FILE_NAME = "i3dmapper-profile"
+
+COMMANDS = ("map", "check", "batch", "watch", "bench")
+EXIT_OK = 0
+EXIT_ERRORS = 1
+EXIT_USAGE = 2
+EXIT_CHANGES = 3
+
+
+class Stats:
+    """
+    Per-phase wall times and counters of a run, reported with --stats.
+
+    Every Logger carries one, so the pipeline stages time themselves
+    through the logger they already get. Pool workers send theirs back to
+    be merged into the parent's. Updates take a lock, so a Stats can be
+    shared between threads along with its logger.
+
+    While tracemalloc is tracing (--trace-memory), the TRACED_PHASES are
+    wrapped in snapshots: allocations holds the bytes each source line
+    still held at the end of a phase and peaks the highest memory growth
+    seen during it.
+    """
+
+    PHASES = ("read", "plan", "parse_i3d", "map", "rewrite_refs", "cleanup", "serialize", "write")
+    TRACED_PHASES = frozenset(("parse_i3d", "rewrite_refs"))
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = Counter()
+        self.counters = Counter()
+        self.allocations = {}
+        self.peaks = Counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        before = None
+        if name in self.TRACED_PHASES and tracemalloc.is_tracing():
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - base if before is not None else 0
+            with self._lock:
+                self.seconds[name] += elapsed
+                if before is not None:
+                    self.peaks[name] = max(self.peaks[name], peak)
+            if before is not None:
+                self._record_allocations(name, before, tracemalloc.take_snapshot())
+
+    def _record_allocations(self, name: str, before, after):
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen *>")]
+        sites = Counter()
+        for diff in after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno"):
+            if diff.size_diff > 0:
+                frame = diff.traceback[0]
+                sites[f"{frame.filename}:{frame.lineno}"] += diff.size_diff
+        with self._lock:
+            self.allocations.setdefault(name, Counter()).update(sites)
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def merge(self, other):
+        with self._lock:
+            self.seconds.update(other.seconds)
+            self.counters.update(other.counters)
+            for name, sites in other.allocations.items():
+                self.allocations.setdefault(name, Counter()).update(sites)
+            for name, peak in other.peaks.items():
+                self.peaks[name] = max(self.peaks[name], peak)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            report = {
+                "seconds": round(time.perf_counter() - self.started, 6),
+                "phases": {name: round(self.seconds[name], 6) for name in self.PHASES},
+                "counters": dict(sorted(self.counters.items())),
+            }
+            if self.allocations:
+                report["memory"] = {
+                    name: {"peak_bytes": self.peaks[name], "top_sites": sites.most_common(25)}
+                    for name, sites in self.allocations.items()
+                }
+        return report
+
+
+class Logger:
+    """
+    Run log that echoes to the console and writes to a log file.
+
+    The log file is opened once and written through a buffered handle;
+    errors flush it immediately and close() flushes the rest. Writes are
+    serialized with a lock so one logger can be shared between threads.
+    In quiet mode only errors are echoed to the console. error_count
+    counts the errors logged so far and stats collects the phase timings;
+    swap_stats() replaces it under the same lock.
+    """
+
+    def __init__(self, log_path=None, quiet: bool = False, append: bool = False):
+        self.log_path = log_path
+        self.quiet = quiet
+        self.error_count = 0
+        self.stats = Stats()
+        self._lock = threading.Lock()
+        self._file = None
+        if log_path:
+            self._file = open(log_path, "a" if append else "w", encoding="utf-8", buffering=LOG_BUFFER_SIZE)
+
+    def log(self, msg: str):
+        with self._lock:
+            if not self.quiet:
+                print(msg)
+            if self._file:
+                self._file.write(msg + "\n")
+
+    def error(self, msg: str):
+        with self._lock:
+            self.error_count += 1
+            print(msg)
+            if self._file:
+                self._file.write(msg + "\n")
+                self._file.flush()
+
+    def section(self, title: str):
+        self.log("")
+        self.log("====================================")
+        self.log(title)
+        self.log("====================================")
+
+    def swap_stats(self, stats: Stats) -> Stats:
+        """Install stats as the logger's Stats and return the previous one."""
+        with self._lock:
+            previous, self.stats = self.stats, stats
+        return previous
+
+    def write(self, text: str):
+        """Write text to the log file only."""
+        with self._lock:
+            if self._file:
+                self._file.write(text)
+
+    def flush(self):
+        with self._lock:
+            if self._file:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordingLogger(Logger):
+    """
+    Logger that only collects (is_error, msg) records, used in pool workers
+    so the parent process can replay them with replay().
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def log(self, msg: str):
+        self.records.append((False, msg))
+
+    def error(self, msg: str):
+        self.error_count += 1
+        self.records.append((True, msg))
+
+
+def replay(records, logger: Logger):
+    for is_error, msg in records:
+        if is_error:
+            logger.error(msg)
+        else:
+            logger.log(msg)
+
+
+def init_logger(mod_root: str, quiet: bool = False, log_name: str = LOG_FILE_NAME, append: bool = False) -> Logger:
     """
     Initialize logger for a given mod root.
 
     Each time the script is run, the log for that mod is reset.
     If multiple files from the same mod are processed in one run,
-    they will all share this single fresh log file.
+    they will all share this single fresh log file. append continues an
+    existing log instead, for a log that was closed earlier in the run.
     """
-    global LOG_FILE_PATH, CURRENT_MOD_ROOT
-    CURRENT_MOD_ROOT = mod_root
-    LOG_FILE_PATH = os.path.join(mod_root, "log.txt")
+    logger = Logger(os.path.join(mod_root, log_name), quiet, append)
+    if append:
+        return logger
 
     header = (
         f"I3D Mapper Log - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        "========================================\n"
+        "========================================"
     )
+    logger.log(header)
+    return logger
 
 
-    with open(LOG_FILE_PATH, "w", encoding="utf-8") as f:
-        f.write(header)
+def is_numeric_node(value: str) -> bool:
+    """Match paths like 0> or 0>0|1|2."""
+    return re.fullmatch(r"\d>[0-9|]*", value or "") is not None
 
-    print(header, end="")
 
+def remove_tags(root, tag_names) -> int:
+    """
+    Remove every descendant of root whose tag is in tag_names.
 
+    Each parent's children are filtered while the tree is walked, so the
+    cleanup is a single linear pass. Subtrees of removed elements are not
+    visited. Returns the number of removed elements.
+    """
+    tag_names = frozenset(tag_names)
+    removed = 0
+    stack = [root]
 
-def log(msg: str):
-    print(msg)
-    if LOG_FILE_PATH:
-        with open(LOG_FILE_PATH, "a", encoding="utf-8") as f:
-            f.write(msg + "\n")
+    while stack:
+        parent = stack.pop()
+        children = list(parent)
+        kept = [child for child in children if child.tag not in tag_names]
+        if len(kept) != len(children):
+            parent[:] = kept
+            removed += len(children) - len(kept)
+        stack.extend(kept)
 
+    return removed
 
-def rename_logger(msg: str):
-    log(msg)
 
+def replace_node_references(root, map_cache, attributes=NODE_ATTRIBUTES):
+    """
+    Rewrite numeric node references to i3dMapping ids in a single tree walk.
 
-def is_numeric_node(value: str) -> bool:
-    """Match paths like 0> or 0>0|1|2."""
-    return re.fullmatch(r"\d>[0-9|]*", value or "") is not None
+    Attributes listed in attributes are rewritten on every element except
+    <i3dMapping>, where only index is fixed. Returns (replaced, fix_count)
+    with replaced being a Counter of replacements per attribute name.
+    """
+    replaced = Counter()
+    fix_count = 0
+
+    for elem in root.iter():
+        attrib = elem.attrib
+        if not attrib:
+            continue
 
+        if elem.tag == "i3dMapping":
+            node_index = attrib.get("index")
+            if node_index and is_numeric_node(node_index):
+                node_id = map_cache.get(node_index)
+                if node_id is not None:
+                    attrib["index"] = node_id
+                    fix_count += 1
+            continue
 
-def xpath_attrib_find(attrib: str) -> str:
-    return ".//*[@" + attrib + "]"
+        for attr_name, value in attrib.items():
+            if attr_name in attributes and is_numeric_node(value):
+                node_id = map_cache.get(value)
+                if node_id is not None:
+                    attrib[attr_name] = node_id
+                    replaced[attr_name] += 1
+
+    return replaced, fix_count
 
 
 def clean_path(base_folder: str, filename: str) -> str:
@@ -87,19 +369,6 @@ def node_maker(component: int, depth_list=None) -> str:
     return this_node + "|".join([str(i) for i in depth_list])
 
 
-def depth_iter(element, tag=None):
-    """Yield (element, depth) for depth-first traversal."""
-    stack = [iter([element])]
-    while stack:
-        e = next(stack[-1], None)
-        if e is None:
-            stack.pop()
-        else:
-            stack.append(iter(e))
-            if tag is None or e.tag == tag:
-                yield (e, len(stack) - 1)
-
-
 def find_mod_root(start_path: str) -> str:
     """
     Walk up from a file or folder until we find a modDesc.xml / moddesc.xml.
@@ -123,281 +392,2868 @@ def find_mod_root(start_path: str) -> str:
         current = parent
 
 
-def generate_i3d_mapping(i3d_file, unique_names):
+def iter_scene_nodes(i3d_file, chunk_size: int = 1 << 16):
+    """
+    Stream an i3d file and yield (name, depth, offset) for every node below <Scene>.
+
+    Depth counts from the <Scene> element at 1, so components are yielded
+    at depth 2. offset is the byte position of the node's start tag
+    in the file. No tree is built: <Files>, <Materials>, <Shapes> and friends
+    are only tokenized as they stream by and parsing stops at </Scene>, so
+    memory stays proportional to the Scene depth rather than the file size.
+    """
+    parser = expat.ParserCreate()
+    pending = []
+    depth = 0
+    scene_depth = None
+    scene_done = False
+
+    def start_element(tag, attrs):
+        nonlocal depth, scene_depth
+        depth += 1
+        if scene_done:
+            return
+        if scene_depth is None:
+            if depth == 2 and tag == "Scene":
+                scene_depth = depth
+        elif depth > scene_depth:
+            pending.append((attrs.get("name"), depth - scene_depth + 1, parser.CurrentByteIndex))
+
+    def end_element(tag):
+        nonlocal depth, scene_done
+        if depth == scene_depth:
+            scene_done = True
+        depth -= 1
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+
+    while not scene_done:
+        chunk = i3d_file.read(chunk_size)
+        parser.Parse(chunk, not chunk)
+        yield from pending
+        pending.clear()
+        if not chunk:
+            break
+
+    if scene_depth is None:
+        raise LookupError("No <Scene> node found in i3d.")
+
+
+class StdlibBackend:
+    """
+    Parser backend built on xml.etree.ElementTree and expat.
+
+    A backend parses and serializes vehicle XMLs and modDescs and streams
+    the Scene of i3ds. Comments and processing instructions inside the
+    root element are kept. Every backend writes through this class's
+    tostring(), so the bytes written do not depend on which parser read
+    the file.
+    """
+
+    name = "stdlib"
+
+    def __init__(self):
+        self.etree = ET
+
+    def __reduce__(self):
+        return get_backend, (self.name,)
+
+    def fromstring(self, data):
+        return ET.fromstring(data, ET.XMLParser(target=ET.TreeBuilder(insert_comments=True, insert_pis=True)))
+
+    def parse_file(self, path: str):
+        with open(path, "rb") as reader:
+            return self.fromstring(reader.read())
+
+    def dumps(self, root) -> bytes:
+        """Serialize a tree as-is, for handing it to another process."""
+        return self.etree.tostring(root)
+
+    def tostring(self, root) -> str:
+        """Serialize a tree indented with four spaces, without XML declaration."""
+        try:
+            ET.indent(root, space="    ")
+        except AttributeError:
+            pass
+        return ET.tostring(root, encoding="unicode")
+
+    def iter_scene_nodes(self, i3d_file):
+        return iter_scene_nodes(i3d_file)
+
+
+class LxmlBackend(StdlibBackend):
+    """
+    Parser backend built on lxml, used when it is installed.
+
+    Its parser is faster on large files and accepts huge trees. Output is
+    still written by the stdlib serializer, so it matches StdlibBackend byte
+    for byte. i3ds are still streamed with expat: renaming patches nodes by
+    byte offset, which lxml does not report.
+    """
+
+    name = "lxml"
+
+    def __init__(self):
+        from lxml import etree
+        self.etree = etree
+        self.parser = etree.XMLParser(huge_tree=True)
+
+    def fromstring(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return self.etree.fromstring(data, self.parser)
+
+    def tostring(self, root) -> str:
+        """Serialize a tree exactly as StdlibBackend would, by copying it into an ElementTree first."""
+        return super().tostring(self.to_stdlib(root))
+
+    def to_stdlib(self, root):
+        """Copy an lxml tree into an xml.etree.ElementTree tree, keeping comments and processing instructions."""
+        def copy_node(node):
+            if node.tag is self.etree.Comment:
+                copied = ET.Comment(node.text)
+            elif node.tag is self.etree.PI:
+                copied = ET.ProcessingInstruction(node.target, node.text)
+            else:
+                copied = ET.Element(node.tag, dict(node.attrib))
+                copied.text = node.text
+            copied.tail = node.tail
+            return copied
+
+        stdlib_root = copy_node(root)
+        stack = [(root, stdlib_root)]
+        while stack:
+            node, copied = stack.pop()
+            for child in node:
+                copied_child = copy_node(child)
+                copied.append(copied_child)
+                stack.append((child, copied_child))
+        return stdlib_root
+
+
+BACKEND_CLASSES = {"stdlib": StdlibBackend, "lxml": LxmlBackend}
+_backends = {}
+
+
+def get_backend(name: str = "auto"):
+    """
+    Return the parser backend called name.
+
+    "auto" picks lxml when it can be imported and the stdlib otherwise.
+    Raises ImportError if lxml is asked for but not installed.
+    """
+    backend = _backends.get(name)
+    if backend is None:
+        if name == "auto":
+            try:
+                backend = get_backend("lxml")
+            except ImportError:
+                backend = get_backend("stdlib")
+        else:
+            backend = BACKEND_CLASSES[name]()
+        _backends[name] = backend
+    return backend
+
+
+def tree_backend(element):
+    """Return the backend whose parser produced element."""
+    if isinstance(element, ET.Element):
+        return get_backend("stdlib")
+    return get_backend("lxml")
+
+
+class SceneIndex:
+    """
+    Compact index of the nodes below <Scene>, in document order.
+
+    Every node is a row in parallel array columns: parent row (-1 for
+    components), depth, component number, ordinal among its siblings and
+    interned name id (-1 for unnamed nodes). Node paths such as "0>1|2" are
+    derived from the columns on demand instead of being stored, which keeps
+    map i3ds with 100k+ nodes small. The name and child tables behind the
+    lookups are built lazily in one O(n) pass and rebuilt after the index
+    changes; after that, a name -> node lookup is O(1) and a path -> node
+    lookup takes one step per level of the path.
+    """
+
+    __slots__ = (
+        "names", "name_ids", "parent", "depth", "component", "ordinal",
+        "name_id", "_name_nodes", "_roots", "_stack", "_child_counts",
+        "_child_start", "_children",
+    )
+
+    def __init__(self):
+        self.names = []
+        self.name_ids = {}
+        self.parent = array("i")
+        self.depth = array("H")
+        self.component = array("i")
+        self.ordinal = array("i")
+        self.name_id = array("i")
+        self._name_nodes = None
+        self._roots = array("i")
+        self._stack = []
+        self._child_counts = []
+        self._child_start = None
+        self._children = None
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def add(self, name, depth: int) -> int:
+        """Append the next node in document order; depth 2 starts a component."""
+        level = depth - 2
+        del self._stack[level:]
+        del self._child_counts[level:]
+
+        row = len(self.parent)
+        if self._stack:
+            parent = self._stack[-1]
+            ordinal = self._child_counts[-1]
+            self._child_counts[-1] += 1
+            component = self.component[parent]
+        else:
+            parent = -1
+            ordinal = component = len(self._roots)
+            self._roots.append(row)
+
+        self.parent.append(parent)
+        self.depth.append(depth)
+        self.component.append(component)
+        self.ordinal.append(ordinal)
+        self.name_id.append(self._intern(name) if name else -1)
+        self._stack.append(row)
+        self._child_counts.append(0)
+        self._child_start = self._children = None
+        self._name_nodes = None
+        return row
+
+    def rename(self, row: int, name: str):
+        self.name_id[row] = self._intern(name)
+        self._name_nodes = None
+
+    def _intern(self, name: str) -> int:
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def name(self, row: int):
+        name_id = self.name_id[row]
+        return self.names[name_id] if name_id >= 0 else None
+
+    def path(self, row: int) -> str:
+        """Return the i3dMapping node path of a row, e.g. "0>1|2"."""
+        ordinals = []
+        while self.parent[row] >= 0:
+            ordinals.append(self.ordinal[row])
+            row = self.parent[row]
+        if not ordinals:
+            return node_maker(self.component[row])
+        return node_maker(self.component[row], reversed(ordinals))
+
+    def node_for_name(self, name: str) -> int:
+        """Return the first row called name, or -1."""
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            return -1
+        if self._name_nodes is None:
+            name_nodes = array("i", [-1]) * len(self.names)
+            for row in range(len(self.name_id) - 1, -1, -1):
+                if self.name_id[row] >= 0:
+                    name_nodes[self.name_id[row]] = row
+            self._name_nodes = name_nodes
+        return self._name_nodes[name_id]
+
+    def node_for_path(self, path: str) -> int:
+        """Return the row at an i3dMapping node path, or -1."""
+        component, sep, rest = path.partition(">")
+        if not sep or not component.isdigit():
+            return -1
+        component = int(component)
+        if component >= len(self._roots):
+            return -1
+        row = self._roots[component]
+        if not rest:
+            return row
+
+        if self._children is None:
+            self._build_children()
+        child_start = self._child_start
+        for part in rest.split("|"):
+            if not part.isdigit():
+                return -1
+            child = child_start[row] + int(part)
+            if child >= child_start[row + 1]:
+                return -1
+            row = self._children[child]
+        return row
+
+    def _build_children(self):
+        # Children of a row are stored contiguously in _children, starting at
+        # _child_start[row]; document order keeps them sorted by ordinal.
+        count = len(self.parent)
+        child_start = array("i", bytes(4 * (count + 1)))
+        for parent in self.parent:
+            if parent >= 0:
+                child_start[parent + 1] += 1
+        for row in range(count):
+            child_start[row + 1] += child_start[row]
+        children = array("i", bytes(4 * max(count - len(self._roots), 0)))
+        fill = array("i", child_start)
+        for row, parent in enumerate(self.parent):
+            if parent >= 0:
+                children[fill[parent]] = row
+                fill[parent] += 1
+        self._child_start = child_start
+        self._children = children
+
+    def get(self, path: str, default=None):
+        """Return the id of the node at path, so the index can stand in for a node -> id dict."""
+        row = self.node_for_path(path)
+        if row < 0 or self.name_id[row] < 0:
+            return default
+        return self.names[self.name_id[row]]
+
+    def iter_mappings(self):
+        """Yield (id, node) for every named node in document order."""
+        names = self.names
+        for row, name_id in enumerate(self.name_id):
+            if name_id >= 0:
+                yield names[name_id], self.path(row)
+
+    def has_unique_names(self) -> bool:
+        named = [name_id for name_id in self.name_id if name_id >= 0]
+        return len(set(named)) == len(named)
+
+    def to_state(self) -> dict:
+        """Return a JSON-ready form of the index, reversed by from_state()."""
+        return {
+            "names": self.names,
+            "parent": self.parent.tolist(),
+            "name_id": self.name_id.tolist(),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        index = cls()
+        names = state["names"]
+        depth = index.depth
+        for parent, name_id in zip(state["parent"], state["name_id"]):
+            index.add(names[name_id] if name_id >= 0 else None, depth[parent] + 1 if parent >= 0 else 2)
+        return index
+
+
+@dataclass
+class I3DMapping:
+    """
+    Generated mapping of one i3d.
+
+    index is the SceneIndex of the i3d after renaming. renamed_nodes is a
+    list of (offset, original_name, new_name) tuples; offset is the byte
+    position of the renamed node's start tag, as consumed by
+    patch_i3d_names(). digest is the blake2b digest of the i3d as
+    map_i3d() left it, when that is known without reading the file again.
+    """
+    index: SceneIndex
+    renamed_nodes: list = field(default_factory=list)
+    digest: str = None
+
+    @property
+    def node_to_id(self) -> SceneIndex:
+        return self.index
+
+    @property
+    def mappings(self):
+        return self.index.iter_mappings()
+
+    def to_element(self, etree=ET):
+        """Build a fresh <i3dMappings> element holding one <i3dMapping> per record."""
+        root = etree.Element("i3dMappings")
+        for name, node in self.mappings:
+            etree.SubElement(root, "i3dMapping", id=name, node=node)
+        return root
+
+    def to_text(self) -> str:
+        return format_i3d_mappings(self.mappings)
+
+
+def node_sort_key(node: str):
+    """Return a tuple ordering node paths in document order, or None for a malformed path."""
+    if not RE_NODE_PATH.fullmatch(node):
+        return None
+    component, _, rest = node.partition(">")
+    if not rest:
+        return (int(component),)
+    return (int(component), *map(int, rest.split("|")))
+
+
+def previous_mappings(shop_xmls):
+    """Collect the (id, node) pairs of the existing <i3dMappings> of vehicle XMLs."""
+    mappings = {}
+    for shop_xml in shop_xmls:
+        for this_map in shop_xml.findall(XPATH_I3D_MAPPING):
+            node_id = this_map.attrib.get("id")
+            node = this_map.attrib.get("node")
+            if node_id and node:
+                mappings.setdefault(node, node_id)
+    return [(node_id, node) for node, node_id in mappings.items()]
+
+
+def longest_increasing_pairs(pairs):
+    """Return the longest run of (a, b) pairs, kept in order, whose a values increase."""
+    from bisect import bisect_left
+
+    tails = []
+    tail_values = []
+    links = [-1] * len(pairs)
+    for i, (a, _) in enumerate(pairs):
+        k = bisect_left(tail_values, a)
+        if k:
+            links[i] = tails[k - 1]
+        if k == len(tails):
+            tails.append(i)
+            tail_values.append(a)
+        else:
+            tails[k] = i
+            tail_values[k] = a
+
+    run = []
+    i = tails[-1] if tails else -1
+    while i >= 0:
+        run.append(pairs[i])
+        i = links[i]
+    run.reverse()
+    return run
+
+
+def match_previous_names(index: SceneIndex, duplicated, previous):
+    """
+    Yield (row, previous_id) for duplicated nodes that still exist in a
+    previous mapping.
+
+    Node paths shift when nodes are inserted or removed, so the previous
+    ids are aligned with the current named nodes in document order, keyed by
+    base name and depth. Keys found exactly once on both sides, which are
+    mostly unique names, are anchors: the longest run of them in the same
+    order on both sides is kept, and between two anchors the duplicates of
+    each key are paired up in order. Apart from ordering the anchors this
+    is linear in the number of nodes.
+    """
+    names = index.names
+    dup_names = {names[name_id] for name_id in duplicated}
+
+    old = []
+    for old_id, node in sorted(
+        ((old_id, node_sort_key(node)) for old_id, node in previous),
+        key=lambda pair: pair[1] or (),
+    ):
+        if node is None:
+            continue
+        match = RE_NAME_SUFFIX.match(old_id)
+        base = match.group(1) if match and match.group(1) in dup_names else old_id
+        old.append(((base, len(node)), old_id))
+
+    rows = [row for row, name_id in enumerate(index.name_id) if name_id >= 0]
+    new_keys = [(names[index.name_id[row]], index.depth[row] - 1) for row in rows]
+
+    old_counts = Counter(key for key, _ in old)
+    new_counts = Counter(new_keys)
+    old_positions = {key: pos for pos, (key, _) in enumerate(old) if old_counts[key] == 1}
+    anchors = longest_increasing_pairs([
+        (old_positions[key], new_pos) for new_pos, key in enumerate(new_keys)
+        if new_counts[key] == 1 and key in old_positions
+    ])
+
+    old_start = new_start = 0
+    for old_end, new_end in anchors + [(len(old), len(rows))]:
+        queues = {}
+        for old_pos in range(old_start, old_end):
+            key, old_id = old[old_pos]
+            queues.setdefault(key, deque()).append(old_id)
+        for new_pos in range(new_start, new_end):
+            row = rows[new_pos]
+            if index.name_id[row] in duplicated:
+                queue = queues.get(new_keys[new_pos])
+                if queue:
+                    yield row, queue.popleft()
+        if new_end < len(rows) and index.name_id[rows[new_end]] in duplicated:
+            yield rows[new_end], old[old_end][1]
+        old_start, new_start = old_end + 1, new_end + 1
+
+
+def assign_unique_names(index: SceneIndex, previous=None):
+    """
+    Return {row: new_name} for the nodes that must be renamed so every
+    name in the index is unique.
+
+    Nodes found in previous, a list of (id, node) pairs from an earlier
+    run, keep the id they had; the first remaining node of each name keeps
+    it and the others get the next free _NNN suffix. Without a previous
+    mapping this numbers duplicates in traversal order. New names never
+    reuse an existing name or a previous id, so they cannot collide or
+    silently take over a reference to a deleted node.
+    """
+    counts = Counter(name_id for name_id in index.name_id if name_id >= 0)
+    duplicated = {name_id for name_id, count in counts.items() if count > 1}
+    if not duplicated:
+        return {}
+
+    names = index.names
+    used = {names[name_id] for name_id in counts if name_id not in duplicated}
+    reserved = set(names)
+    final = {}
+
+    if previous:
+        reserved.update(old_id for old_id, _ in previous)
+        for row, old_id in match_previous_names(index, duplicated, previous):
+            base = names[index.name_id[row]]
+            if old_id not in used and (old_id == base or RE_NAME_SUFFIX.match(old_id)):
+                final[row] = old_id
+                used.add(old_id)
+
+    next_suffix = {}
+    for row, name_id in enumerate(index.name_id):
+        if name_id not in duplicated or row in final:
+            continue
+        base = names[name_id]
+        if base not in used:
+            new_name = base
+        else:
+            suffix = next_suffix.get(base, 2)
+            new_name = f"{base}_{suffix:0>3}"
+            while new_name in used or new_name in reserved:
+                suffix += 1
+                new_name = f"{base}_{suffix:0>3}"
+            next_suffix[base] = suffix + 1
+        final[row] = new_name
+        used.add(new_name)
+
+    return {row: new_name for row, new_name in final.items() if new_name != names[index.name_id[row]]}
+
+
+def generate_i3d_mapping(i3d_file, logger: Logger, previous=None, backend=None):
+    """
+    Build the I3DMapping for an i3d opened in binary mode, streamed by
+    backend (the automatic choice by default).
+
+    previous is an optional list of (id, node) pairs from an earlier
+    mapping of the same i3d; duplicates that still exist keep their old
+    suffixes (see assign_unique_names()). Returns None after logging the
+    reason if the i3d cannot be mapped.
+    """
+    index = SceneIndex()
+    offsets = array("q")
+    stats = logger.stats
+
     try:
-        i3d_text = i3d_file.read()
-        this_xml = ET.ElementTree(ET.fromstring(i3d_text))
+        with stats.phase("parse_i3d"):
+            for this_node_name, depth, offset in (backend or get_backend()).iter_scene_nodes(i3d_file):
+                index.add(this_node_name, depth)
+                offsets.append(offset)
+    except LookupError as e:
+        logger.error(f"[ERROR] {str(e)}")
+        return None
     except Exception as e:
-        log(f"[ERROR] Failed to parse i3d file: {str(e)}")
-        return None, None
+        logger.error(f"[ERROR] Failed to parse i3d file: {str(e)}")
+        return None
 
-    this_scene = this_xml.find('Scene')
-    if this_scene is None:
-        log("[ERROR] No <Scene> node found in i3d.")
-        return None, None
-
-    print_names = []
-    last_depth = 0
-    count_depth = []
-    current_component = -1
     renamed_nodes = []
+    with stats.phase("map"):
+        new_names = assign_unique_names(index, previous)
+        for row in sorted(new_names):
+            renamed_nodes.append((offsets[row], index.name(row), new_names[row]))
+            index.rename(row, new_names[row])
+    stats.count("nodes", len(index))
+    stats.count("renames", len(renamed_nodes))
 
-    for xml_entry, depth in depth_iter(this_scene):
-        this_node_name = xml_entry.get('name')
-        original_name = this_node_name
+    return I3DMapping(index, renamed_nodes)
 
-        if depth > 1 and this_node_name:
-            if this_node_name in unique_names:
-                unique_names[this_node_name] += 1
-                this_node_name = f"{this_node_name}_{unique_names[this_node_name]:0>3}"
-                xml_entry.set('name', this_node_name)
-                renamed_nodes.append((original_name, this_node_name))
-            else:
-                unique_names[this_node_name] = 1
-
-        if depth == 2:
-            current_component += 1
-            count_depth = []
-            last_depth = 0
-            node_path = node_maker(current_component)
-            if this_node_name:
-                print_names.append([this_node_name, node_path])
-
-        elif depth > 2:
-            last_map_index = depth - 2
-            if last_map_index > last_depth:
-                count_depth.extend([0] * (last_map_index - last_depth))
-            else:
-                for _ in range(last_depth - last_map_index):
-                    if count_depth:
-                        count_depth.pop()
-                if count_depth:
-                    count_depth[last_map_index - 1] += 1
-            last_depth = last_map_index
-            node_path = node_maker(current_component, count_depth)
-            if this_node_name:
-                print_names.append([this_node_name, node_path])
+
+def format_i3d_mappings(mappings) -> str:
+    """Render (id, node) pairs as an <i3dMappings> block."""
+    from xml.sax.saxutils import quoteattr
 
     output_queue = ["<i3dMappings>"]
-    for name, node in print_names:
-        output_queue.append(f'\t<i3dMapping id="{name}" node="{node}" />')
+    for name, node in mappings:
+        output_queue.append(f'\t<i3dMapping id={quoteattr(name)} node={quoteattr(node)} />')
     output_queue.append("</i3dMappings>")
+    return "\n".join(output_queue)
 
+
+def log_renames(renamed_nodes, logger: Logger, dry_run: bool = False):
     if renamed_nodes:
-        rename_logger(f"🧭 {len(renamed_nodes)} duplicate node name(s) were renamed:")
-        for original, renamed in renamed_nodes:
-            rename_logger(f'  • "{original}" -> "{renamed}"')
+        verb = "would be" if dry_run else "were"
+        logger.log(f"🧭 {len(renamed_nodes)} duplicate node name(s) {verb} renamed:")
+        for _, original, renamed in renamed_nodes:
+            logger.log(f'  • "{original}" -> "{renamed}"')
     else:
-        rename_logger("✅ No duplicate node names found.")
+        logger.log("✅ No duplicate node names found.")
+
 
-    return "\n".join(output_queue), this_xml
+def name_attr_end(buf, tag_offset: int) -> int:
+    """
+    Return the byte position of the closing quote of the name attribute in
+    the start tag beginning at tag_offset.
+    """
+    match = RE_TAG_NAME.match(buf, tag_offset)
+    if match is None:
+        raise ValueError(f"No start tag at byte {tag_offset}")
+    pos = match.end()
+    while True:
+        match = RE_TAG_ATTRIB.match(buf, pos)
+        if match is None:
+            raise ValueError(f"No name attribute in tag at byte {tag_offset}")
+        if match.group(1) == b"name":
+            return match.end() - 1
+        pos = match.end()
 
 
-def process_xml(xml_path: str, mod_root: str):
+def patch_i3d_names(i3d_path: str, renamed_nodes, expected_stat=None):
+    """
+    Write the renames collected by generate_i3d_mapping() into the i3d.
+
+    The file is memory-mapped and copied through verbatim; only the new
+    suffixes are spliced in after the existing name values, so comments,
+    formatting and the XML declaration are left untouched. The cost is one
+    sequential copy of the file, with no parse or re-serialize.
+
+    Returns the blake2b hex digest of the written file.
+    """
+    if expected_stat is not None:
+        current = os.stat(i3d_path)
+        if (current.st_size, current.st_mtime_ns) != (expected_stat.st_size, expected_stat.st_mtime_ns):
+            raise RuntimeError(f"i3d changed on disk while processing: {i3d_path}")
+
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    tmp_path = i3d_path + ".tmp"
     try:
-        rel_xml = os.path.relpath(xml_path, mod_root)
-        log("")
-        log("====================================")
-        log(f"🔍 Processing XML: {rel_xml}")
-        log("====================================")
-
-        if not os.path.isfile(xml_path):
-            log(f"❌ XML file not found: {xml_path}")
-            return
+        with open(i3d_path, "rb") as source, \
+                mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as buf, \
+                memoryview(buf) as view, \
+                open(tmp_path, "wb") as writer:
+            pos = 0
+            for offset, original, renamed in sorted(renamed_nodes):
+                value_end = name_attr_end(buf, offset)
+                suffix = renamed[len(original):].encode("ascii")
+                writer.write(view[pos:value_end])
+                writer.write(suffix)
+                digest.update(view[pos:value_end])
+                digest.update(suffix)
+                pos = value_end
+            writer.write(view[pos:])
+            digest.update(view[pos:])
+        shutil.copymode(i3d_path, tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, i3d_path)
+    return digest.hexdigest()
+
+
+def splice_i3d_names(reader, writer, renamed_nodes, chunk_size: int = 1 << 20):
+    """
+    Stream an i3d from reader to writer, splicing in the rename suffixes.
 
-        with open(xml_path, 'r', encoding='utf-8') as file:
-            xml_content = file.read()
+    Same output as patch_i3d_names(), for sources that cannot be
+    memory-mapped such as zip members. Only the start tag of a renamed node
+    is ever buffered beyond one chunk.
+    """
+    pending = b""
+    pos = 0
+
+    for offset, original, renamed in sorted(renamed_nodes):
+        while pos + len(pending) < offset:
+            writer.write(pending)
+            pos += len(pending)
+            pending = reader.read(min(chunk_size, offset - pos))
+            if not pending:
+                raise ValueError(f"i3d ended before byte {offset}")
+        writer.write(pending[:offset - pos])
+        pending = pending[offset - pos:]
+        pos = offset
+
+        while True:
+            try:
+                value_end = name_attr_end(pending, 0)
+                break
+            except ValueError:
+                more = reader.read(chunk_size)
+                if not more or len(pending) > chunk_size:
+                    raise
+                pending += more
+
+        writer.write(pending[:value_end])
+        writer.write(renamed[len(original):].encode("ascii"))
+        pending = pending[value_end:]
+        pos += value_end
+
+    writer.write(pending)
+    shutil.copyfileobj(reader, writer, chunk_size)
+
+
+def xml_diff(old: bytes, new: bytes, name: str) -> str:
+    """Return a unified diff between two versions of an XML file called name."""
+    from difflib import unified_diff
+
+    return "\n".join(unified_diff(
+        old.decode("utf-8", "replace").splitlines(), new.decode("utf-8", "replace").splitlines(),
+        f"a/{name}", f"b/{name}", lineterm="",
+    ))
+
+
+def i3d_rename_diff(reader, renamed_nodes, name: str) -> str:
+    """
+    Return a unified diff of the start tags that renamed_nodes would change
+    in the i3d read from reader.
+
+    The i3d is streamed line by line and only lines holding a renamed node
+    are decoded, so this stays cheap for i3ds with large <Shapes> blocks.
+    A start tag wrapped over several lines is read up to its closing ">"
+    and shown as one hunk. Renames that still cannot be located are listed
+    after the hunks instead of being dropped.
+    """
+    renames = sorted(renamed_nodes)
+    lines = [f"--- a/{name}", f"+++ b/{name}"]
+    missing = []
+    current = 0
+    pos = 0
+    number = 0
+    reader = iter(reader)
+    for line in reader:
+        number += 1
+        first = number
+        old = new = line
+        changed = False
+        while current < len(renames) and renames[current][0] < pos + len(old):
+            offset, original, renamed = renames[current]
+            start = offset - pos + len(new) - len(old)
+            try:
+                value_end = name_attr_end(new, start)
+            except ValueError:
+                more = None if b">" in new[start:] else next(reader, None)
+                if more is None:
+                    missing.append(renames[current])
+                    current += 1
+                else:
+                    old += more
+                    new += more
+                    number += 1
+                continue
+            current += 1
+            new = new[:value_end] + renamed[len(original):].encode("ascii") + new[value_end:]
+            changed = True
+        if changed:
+            old_lines = old.splitlines()
+            span = f"{first}" if len(old_lines) == 1 else f"{first},{len(old_lines)}"
+            lines.append(f"@@ -{span} +{span} @@")
+            lines.extend("-" + part.decode("utf-8", "replace") for part in old_lines)
+            lines.extend("+" + part.decode("utf-8", "replace") for part in new.splitlines())
+        if current == len(renames):
+            break
+        pos += len(old)
+    missing.extend(renames[current:])
+    for offset, original, renamed in missing:
+        lines.append(f'# "{original}" -> "{renamed}" at byte {offset} could not be shown')
+    return "\n".join(lines)
+
+
+def stream_digest(reader) -> str:
+    """Return the blake2b hex digest of what is left in a binary reader, read in chunks."""
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for chunk in iter(lambda: reader.read(1 << 20), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """Return the blake2b hex digest of a file."""
+    with open(path, "rb") as reader:
+        return stream_digest(reader)
+
+
+class ModFiles:
+    """
+    Access to the files of a mod, addressed by path.
 
-        shop_xml = ET.fromstring(xml_content)
+    The mapping pipeline reads and writes mod files only through a ModFiles,
+    so the same code serves mod folders, handled here directly on disk, and
+    zipped mods (ZipModFiles). Writes to a folder take effect at once, so
+    there are no pending writes and commit() has nothing to do.
+    """
 
-        i3d_tag = shop_xml.find(".//base/filename")
-        if i3d_tag is None or not i3d_tag.text or not i3d_tag.text.strip():
-            log("❌ <base><filename> tag missing or empty. Skipping.")
-            return
+    def find(self, path: str):
+        """Return the path of an existing file, or None."""
+        return path if os.path.isfile(path) else None
 
-        i3d_filename = i3d_tag.text.strip()
+    def open(self, path: str):
+        return open(path, "rb")
 
-        if i3d_filename.startswith("$data"):
-            log(f"ℹ️ i3d file is in $data ({i3d_filename}). Skipping.")
-            return
+    def read(self, path: str) -> bytes:
+        with self.open(path) as reader:
+            return reader.read()
 
-        i3d_path = clean_path(mod_root, i3d_filename)
-        log(f"📄 i3d path resolved to: {os.path.relpath(i3d_path, mod_root)}")
+    def stat(self, path: str):
+        return os.stat(path)
 
-        if not os.path.isfile(i3d_path):
-            log(f"❌ .i3d file not found: {i3d_path}")
-            return
+    def digest(self, path: str) -> str:
+        return file_digest(path)
+
+    def matches(self, path: str, data: bytes) -> bool:
+        return file_matches(path, data)
+
+    def write(self, path: str, data: bytes) -> bool:
+        """Write data unless the file already holds it. Returns True if written."""
+        return write_if_changed(path, data)
+
+    def replace(self, path: str, data: bytes):
+        """Write data through a temporary file, so readers never see half of it."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as writer:
+            writer.write(data)
+        os.replace(tmp_path, path)
+
+    def patch_i3d(self, i3d_path: str, renamed_nodes, expected_stat=None) -> str:
+        return patch_i3d_names(i3d_path, renamed_nodes, expected_stat)
+
+    def take_writes(self):
+        """Return and forget the pending writes, for handing them to another process."""
+        return None
+
+    def add_writes(self, writes):
+        """Take over pending writes returned by take_writes() of another process."""
+
+    def commit(self, logger, results, dry_run: bool = False):
+        """Carry out the pending writes of the run that produced results."""
+
+    def close(self):
+        pass
+
+
+FOLDER_FILES = ModFiles()
+
+
+class MappingCache:
+    """
+    On-disk cache of i3d mapping results, stored in CACHE_DIR_NAME under a
+    mod root.
+
+    Entries are small JSON files, one per i3d path, holding the SceneIndex
+    state and the rename plan. An entry is reused when the
+    i3d still has the recorded size and mtime; if only the mtime moved, the
+    blake2b content hash decides. The directory is kept below max_bytes by
+    evicting the least recently used entries.
+
+    The last memory_entries hits and puts are also kept in memory, so a
+    long-lived Mapper answers repeated lookups without reading the entry.
+    Caches given the same memory dict share that limit. The in-memory part
+    is not pickled into pool workers. A read_only cache
+    never touches its directory, for dry runs.
+
+    The directory also holds the mod graph of the last run (graph_name,
+    GRAPH_FILE_NAME by default), which is never evicted.
+    """
+
+    def __init__(self, mod_root: str, max_bytes: int = CACHE_MAX_BYTES, memory_entries: int = CACHE_MEMORY_ENTRIES,
+                 read_only: bool = False, memory=None, graph_name: str = GRAPH_FILE_NAME):
+        self.cache_dir = os.path.join(mod_root, CACHE_DIR_NAME)
+        self.graph_name = graph_name
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.read_only = read_only
+        self._memory = OrderedDict() if memory is None else memory
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_memory"] = OrderedDict()
+        return state
+
+    def _remember(self, entry_path: str, i3d_stat, index, renamed_nodes):
+        self._memory[entry_path] = (i3d_stat.st_size, i3d_stat.st_mtime_ns, index, renamed_nodes)
+        self._memory.move_to_end(entry_path)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _entry_path(self, i3d_path: str) -> str:
+        key = os.path.normcase(os.path.abspath(i3d_path)).encode("utf-8")
+        return os.path.join(self.cache_dir, hashlib.blake2b(key, digest_size=16).hexdigest() + ".json")
+
+    def get(self, i3d_path: str, i3d_stat, digest=None, files=FOLDER_FILES):
+        """
+        Return (index, renamed_nodes) for an unchanged i3d, else None.
+        digest is the i3d's digest if the caller already has it; otherwise
+        it is read through files when needed.
+        """
+        entry_path = self._entry_path(i3d_path)
+        remembered = self._memory.get(entry_path)
+        if remembered and remembered[:2] == (i3d_stat.st_size, i3d_stat.st_mtime_ns):
+            self._memory.move_to_end(entry_path)
+            return remembered[2], remembered[3]
+
+        try:
+            with open(entry_path, "r", encoding="utf-8") as reader:
+                entry = json.load(reader)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("version") != CACHE_VERSION or entry.get("size") != i3d_stat.st_size:
+            return None
+
+        if entry.get("mtime_ns") != i3d_stat.st_mtime_ns:
+            if entry.get("digest") != (digest or files.digest(i3d_path)):
+                return None
+            entry["mtime_ns"] = i3d_stat.st_mtime_ns
+            try:
+                if not self.read_only:
+                    self._write(entry_path, entry)
+            except OSError:
+                pass
+        elif not self.read_only:
+            try:
+                os.utime(entry_path)
+            except OSError:
+                pass
+
+        index = SceneIndex.from_state(entry["index"])
+        renamed_nodes = [tuple(rename) for rename in entry["renames"]]
+        self._remember(entry_path, i3d_stat, index, renamed_nodes)
+        return index, renamed_nodes
+
+    def put(self, i3d_path: str, i3d_stat, index, renamed_nodes, digest=None):
+        entry = {
+            "version": CACHE_VERSION,
+            "path": os.path.abspath(i3d_path),
+            "size": i3d_stat.st_size,
+            "mtime_ns": i3d_stat.st_mtime_ns,
+            "digest": digest or file_digest(i3d_path),
+            "index": index.to_state(),
+            "renames": [list(rename) for rename in renamed_nodes],
+        }
+        entry_path = self._entry_path(i3d_path)
+        self._write(entry_path, entry)
+        self._remember(entry_path, i3d_stat, index, list(renamed_nodes))
+        self._evict()
+
+    def load_graph(self):
+        """Return the mod graph saved by the last run, or None."""
+        try:
+            with open(os.path.join(self.cache_dir, self.graph_name), "r", encoding="utf-8") as reader:
+                graph = json.load(reader)
+        except (OSError, ValueError):
+            return None
+        return graph if graph.get("version") == GRAPH_VERSION else None
+
+    def save_graph(self, graph):
+        if not self.read_only:
+            self._write(os.path.join(self.cache_dir, self.graph_name), graph)
+
+    def _write(self, entry_path: str, entry):
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as writer:
+            json.dump(entry, writer, separators=(",", ":"))
+        os.replace(tmp_path, entry_path)
+
+    def _evict(self):
+        try:
+            entries = []
+            with os.scandir(self.cache_dir) as it:
+                for dir_entry in it:
+                    if dir_entry.name.endswith(".json") and not dir_entry.name.endswith(GRAPH_FILE_NAME):
+                        entry_stat = dir_entry.stat()
+                        entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, dir_entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                os.remove(path)
+                total -= size
+        except OSError:
+            pass
+
+
+def store_in_cache(cache, logger: Logger, *entry):
+    try:
+        cache.put(*entry)
+    except OSError as e:
+        logger.log(f"⚠️ Could not write mapping cache: {str(e)}")
+
+
+def sidecar_path(i3d_path: str) -> str:
+    return i3d_path + SIDECAR_SUFFIX
+
+
+def read_sidecar(i3d_path: str, files=FOLDER_FILES):
+    try:
+        sidecar = json.loads(files.read(sidecar_path(i3d_path)))
+    except (OSError, ValueError):
+        return None
+    return sidecar if sidecar.get("version") == SIDECAR_VERSION else None
+
+
+def load_sidecar(i3d_path: str, i3d_stat, digest=None, files=FOLDER_FILES):
+    """
+    Return the SceneIndex stored in the sidecar of an i3d, or None if there
+    is no sidecar or it no longer describes the i3d.
+
+    Like the mapping cache, a matching size and mtime is trusted and the
+    content hash decides otherwise, so copied or re-extracted mods keep
+    their sidecars. digest is the i3d's digest if the caller already has it.
+    """
+    sidecar = read_sidecar(i3d_path, files)
+    if sidecar is None or sidecar.get("size") != i3d_stat.st_size:
+        return None
+    if sidecar.get("mtime_ns") != i3d_stat.st_mtime_ns and sidecar.get("digest") != (digest or files.digest(i3d_path)):
+        return None
+    return SceneIndex.from_state(sidecar["index"])
+
+
+def write_sidecar(i3d_path: str, i3d_stat, index: SceneIndex, digest: str, files=FOLDER_FILES):
+    """
+    Write <i3d>.map.json next to an i3d whose names need no renaming.
+
+    Besides the index the sidecar lists the (id, node) mappings, so other
+    tools can resolve node paths without parsing the i3d.
+    """
+    sidecar = {
+        "version": SIDECAR_VERSION,
+        "i3d": os.path.basename(i3d_path),
+        "size": i3d_stat.st_size,
+        "mtime_ns": i3d_stat.st_mtime_ns,
+        "digest": digest,
+        "mappings": [list(pair) for pair in index.iter_mappings()],
+        "index": index.to_state(),
+    }
+    files.replace(sidecar_path(i3d_path), json.dumps(sidecar, separators=(",", ":")).encode("utf-8"))
+
+
+def store_sidecar(logger: Logger, i3d_path: str, i3d_stat, index: SceneIndex, digest=None, files=FOLDER_FILES):
+    try:
+        write_sidecar(i3d_path, i3d_stat, index, digest or files.digest(i3d_path), files)
+        logger.log(f"🗺️ Sidecar map written: {os.path.basename(sidecar_path(i3d_path))}")
+    except OSError as e:
+        logger.log(f"⚠️ Could not write sidecar map: {str(e)}")
+
+
+@dataclass
+class PlanStep:
+    """A vehicle XML scheduled by the planner, why, and how many bytes it is expected to read."""
+    xml_key: str
+    i3d_key: str
+    reasons: list
+    cost_bytes: int = 0
+
+
+def graph_key(path: str, mod_root: str) -> str:
+    return os.path.relpath(path, mod_root).replace(os.sep, "/")
+
+
+def graph_record(path: str, kind: str, previous=None, digest=None, files=FOLDER_FILES) -> dict:
+    """
+    Return the graph record of a file: its kind, size, mtime and blake2b
+    digest. A known digest is taken as is; otherwise the digest of previous
+    is reused while size and mtime match.
+    """
+    stat = files.stat(path)
+    record = {"kind": kind, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if digest:
+        record["digest"] = digest
+    elif previous and (previous.get("size"), previous.get("mtime_ns")) == (stat.st_size, stat.st_mtime_ns):
+        record["digest"] = previous.get("digest")
+    else:
+        record["digest"] = files.digest(path)
+    return record
+
+
+def build_mod_graph(moddesc_path: str, groups, mod_root: str, previous=None, files=FOLDER_FILES) -> dict:
+    """
+    Build the dependency graph of a mod from its i3d groups.
+
+    The graph's files hold a record for the modDesc, every vehicle XML and
+    every i3d, keyed by mod-relative path; edges maps each vehicle XML to
+    its i3d, so an i3d shared by several XMLs has several incoming edges.
+    """
+    previous = previous or {}
+    previous_files = previous.get("files", {})
+    records = {}
+    edges = {}
+
+    def add(path: str, kind: str) -> str:
+        key = graph_key(path, mod_root)
+        records[key] = graph_record(path, kind, previous_files.get(key), files=files)
+        return key
+
+    add(moddesc_path, "moddesc")
+    for i3d_path, vehicles in groups.items():
+        i3d_key = add(i3d_path, "i3d")
+        for xml_path, _ in vehicles:
+            edges[add(xml_path, "xml")] = i3d_key
+
+    return {
+        "version": GRAPH_VERSION,
+        "bytes_per_second": previous.get("bytes_per_second"),
+        "files": records,
+        "edges": edges,
+        "failed": [],
+    }
+
+
+def plan_mod(graph, previous, mod_root: str, sidecar: bool = False, files=FOLDER_FILES):
+    """
+    Compare a mod graph with the graph of the previous run.
+
+    Returns (steps, up_to_date): a PlanStep for every vehicle XML with a
+    changed input, and the keys of the XMLs whose own file and i3d are
+    byte-identical to what the previous run left behind. The cost of a
+    step is the XML size plus, for the first step of a changed i3d, the
+    i3d size; unchanged i3ds come from the mapping cache.
+    """
+    records = graph["files"]
+    full_reason = "no previous run" if previous is None else None
+    previous = previous or {}
+    old_files = previous.get("files", {})
+    old_edges = previous.get("edges", {})
+    failed = set(previous.get("failed", []))
+
+    steps = []
+    up_to_date = []
+    costed_i3ds = set()
+    for xml_key, i3d_key in graph["edges"].items():
+        i3d_changed = full_reason or old_files.get(i3d_key, {}).get("digest") != records[i3d_key]["digest"]
+        if full_reason:
+            reasons = [full_reason]
+        elif xml_key in failed:
+            reasons = ["failed last run"]
+        elif xml_key not in old_edges:
+            reasons = ["new vehicle XML"]
+        else:
+            reasons = []
+            if old_files.get(xml_key, {}).get("digest") != records[xml_key]["digest"]:
+                reasons.append("vehicle XML changed")
+            if old_edges[xml_key] != i3d_key:
+                reasons.append("i3d link changed")
+            if i3d_changed:
+                reasons.append(f"i3d changed: {i3d_key}")
+        if sidecar and not files.find(sidecar_path(os.path.normpath(os.path.join(mod_root, i3d_key)))):
+            reasons.append("no sidecar map")
+        if not reasons:
+            up_to_date.append(xml_key)
+            continue
+
+        cost = records[xml_key]["size"]
+        if i3d_changed and i3d_key not in costed_i3ds:
+            costed_i3ds.add(i3d_key)
+            cost += records[i3d_key]["size"]
+        steps.append(PlanStep(xml_key, i3d_key, reasons, cost))
+
+    return steps, up_to_date
+
+
+def graph_i3d_digests(graph, groups, mod_root: str) -> dict:
+    """Return i3d_path -> (size, mtime_ns, digest) from the graph records of the i3ds in groups."""
+    digests = {}
+    for i3d_path in groups:
+        record = graph["files"].get(graph_key(i3d_path, mod_root))
+        if record:
+            digests[i3d_path] = (record["size"], record["mtime_ns"], record["digest"])
+    return digests
+
+
+def log_plan(steps, up_to_date, bytes_per_second, logger: Logger):
+    cost = sum(step.cost_bytes for step in steps)
+    seconds = cost / (bytes_per_second or PLAN_BYTES_PER_SECOND)
+    logger.log(f"📋 Plan: {len(steps)} vehicle XML(s) to process, {len(up_to_date)} up to date "
+               f"(~{cost / 1e6:.1f} MB to read, ~{seconds:.2f}s).")
+    for step in steps:
+        logger.log(f"  • {step.xml_key}: {', '.join(step.reasons)} ({step.cost_bytes / 1e6:.1f} MB)")
+
+
+def plan_moddesc(moddesc_path: str, groups, mod_root: str, logger: Logger, cache, sidecar: bool = False,
+                 files=FOLDER_FILES):
+    """
+    Plan a modDesc run against the graph of the previous run in cache.
+
+    Returns (graph, steps, run_groups, skipped): run_groups holds only the
+    vehicles of groups that have a step, skipped a GroupResult per i3d for
+    the up-to-date XMLs, which count as unchanged.
+    """
+    with logger.stats.phase("plan"):
+        previous = cache.load_graph()
+        graph = build_mod_graph(moddesc_path, groups, mod_root, previous, files)
+        steps, up_to_date = plan_mod(graph, previous, mod_root, sidecar, files)
+    log_plan(steps, up_to_date, graph["bytes_per_second"], logger)
+
+    planned = {step.xml_key for step in steps}
+    run_groups = {}
+    skipped = []
+    for i3d_path, vehicles in groups.items():
+        todo = [vehicle for vehicle in vehicles if graph_key(vehicle[0], mod_root) in planned]
+        if todo:
+            run_groups[i3d_path] = todo
+        done = [xml_path for xml_path, _ in vehicles if graph_key(xml_path, mod_root) not in planned]
+        if done:
+            skipped.append(GroupResult(i3d_path, done, unchanged=list(done)))
+    return graph, steps, run_groups, skipped
+
+
+def save_mod_graph(cache, graph, results, mod_root: str, steps, seconds: float, files=FOLDER_FILES):
+    """
+    Store the graph for the next run: the files of this run are recorded
+    as they were left behind and failed XMLs are marked, so they are
+    planned again. The measured read rate refines the next estimate.
+    """
+    records = graph["files"]
+    for result in results:
+        for xml_path in result.failed:
+            xml_key = graph_key(xml_path, mod_root)
+            graph["edges"].pop(xml_key, None)
+            records.pop(xml_key, None)
+            graph["failed"].append(xml_key)
+        for xml_path in result.updated:
+            xml_key = graph_key(xml_path, mod_root)
+            records[xml_key] = graph_record(xml_path, "xml", records[xml_key], files=files)
+        if result.mapped:
+            i3d_key = graph_key(result.i3d_path, mod_root)
+            records[i3d_key] = graph_record(result.i3d_path, "i3d", records[i3d_key], result.i3d_digest, files)
+
+    cost = sum(step.cost_bytes for step in steps)
+    if cost and seconds > 0:
+        graph["bytes_per_second"] = cost / seconds
+    try:
+        cache.save_graph(graph)
+    except OSError:
+        pass
+
+
+def vehicle_i3d_filename(shop_xml, rel_xml: str, logger: Logger):
+    """Return the mod-relative i3d filename of a vehicle XML, or None if it is skipped."""
+    i3d_tag = shop_xml.find(".//base/filename")
+    if i3d_tag is None or not i3d_tag.text or not i3d_tag.text.strip():
+        logger.error(f"❌ <base><filename> tag missing or empty in {rel_xml}. Skipping.")
+        return None
+
+    i3d_filename = i3d_tag.text.strip()
+
+    if i3d_filename.startswith("$data"):
+        logger.log(f"ℹ️ i3d file of {rel_xml} is in $data ({i3d_filename}). Skipping.")
+        return None
+
+    return i3d_filename
+
+
+def load_vehicle_xml(xml_path: str, mod_root: str, logger: Logger, backend=None, *, files=FOLDER_FILES):
+    """
+    Parse a vehicle XML and resolve the i3d it points at.
+
+    Returns (shop_xml, i3d_path), or (None, None) after logging why the
+    file is skipped.
+    """
+    rel_xml = os.path.relpath(xml_path, mod_root)
+
+    if not files.find(xml_path):
+        logger.error(f"❌ XML file not found: {xml_path}")
+        return None, None
+
+    with logger.stats.phase("read"):
+        content = files.read(xml_path)
+        shop_xml = (backend or get_backend()).fromstring(content)
+    logger.stats.count("xml_files_read")
+    logger.stats.count("bytes_in", len(content))
+
+    i3d_filename = vehicle_i3d_filename(shop_xml, rel_xml, logger)
+    if not i3d_filename:
+        return None, None
+
+    i3d_path = files.find(clean_path(mod_root, i3d_filename))
+
+    if i3d_path is None:
+        logger.error(f"❌ .i3d file not found: {clean_path(mod_root, i3d_filename)}")
+        return None, None
+
+    return shop_xml, i3d_path
+
+
+def map_i3d(i3d_path: str, mod_root: str, logger: Logger, cache=None, sidecar: bool = False, previous=None,
+            backend=None, *, dry_run: bool = False, diff: bool = False, known_digest=None, files=FOLDER_FILES):
+    """
+    Generate the mapping for an i3d and write its duplicate-name renames.
+
+    A current sidecar map is used instead of parsing the i3d. The sidecar
+    is written when sidecar is set or one already exists, so it never
+    goes stale. previous is the earlier mapping whose suffixes renamed
+    duplicates keep; an outdated sidecar stands in for it when not given.
+    Returns the I3DMapping, or None if the i3d could not be mapped.
 
-        with open(i3d_path, 'r', encoding='utf-8') as i3d_file:
-            unique_names = {}
-            i3d_mapping_text, updated_i3d_xml = generate_i3d_mapping(
-                i3d_file, unique_names
-            )
-            if not i3d_mapping_text:
-                return
-
-        map_cache = {}
-        i3d_mapping_root = ET.fromstring(i3d_mapping_text)
-        for this_map in i3d_mapping_root.findall(XPATH_I3D_MAPPING):
-            map_cache[this_map.attrib["node"]] = this_map.attrib["id"]
-
-        replaced_count = 0
-        for this_type in NODE_TYPES:
-            for tag in shop_xml.findall(xpath_attrib_find(this_type)):
-                if tag.tag != "i3dMapping":
-                    my_node = tag.attrib.get(this_type)
-                    if my_node and is_numeric_node(my_node) and my_node in map_cache:
-                        tag.attrib[this_type] = map_cache[my_node]
-                        replaced_count += 1
-        log(f"🔁 Replaced {replaced_count} numeric node reference(s) with i3dMapping IDs.")
+    With dry_run nothing is written: the renames are only reported, as a
+    unified diff too when diff is set.
+
+    known_digest is a (size, mtime_ns, digest) record of the i3d from the
+    planner. While it matches the file, its digest is used for the cache
+    and sidecar instead of hashing the i3d again. All files are accessed
+    through files.
+    """
+    stats = logger.stats
+    with files.open(i3d_path) as i3d_file:
+        i3d_stat = files.stat(i3d_path)
+        digest = None
+        if known_digest and tuple(known_digest[:2]) == (i3d_stat.st_size, i3d_stat.st_mtime_ns):
+            digest = known_digest[2]
+        has_sidecar = files.find(sidecar_path(i3d_path)) is not None
+        sidecar = sidecar or has_sidecar
+        cached = None
+        with stats.phase("parse_i3d"):
+            sidecar_index = load_sidecar(i3d_path, i3d_stat, digest, files) if has_sidecar else None
+            if sidecar_index is None and cache:
+                cached = cache.get(i3d_path, i3d_stat, digest, files)
+        if sidecar_index is not None:
+            logger.log("⚡ i3d matches its sidecar map, using the stored index.")
+            stats.count("sidecar_hits")
+            i3d_mapping = I3DMapping(sidecar_index)
+        elif cached:
+            logger.log("⚡ i3d unchanged since last run, using cached mapping.")
+            stats.count("cache_hits")
+            i3d_mapping = I3DMapping(*cached)
+        else:
+            if not previous and has_sidecar:
+                previous = [tuple(pair) for pair in (read_sidecar(i3d_path, files) or {}).get("mappings", [])]
+            i3d_mapping = generate_i3d_mapping(i3d_file, logger, previous, backend)
+            if i3d_mapping is None:
+                return None
+            stats.count("i3d_files_parsed")
+            stats.count("bytes_in", i3d_stat.st_size)
+
+    index = i3d_mapping.index
+    renamed_nodes = i3d_mapping.renamed_nodes
+    log_renames(renamed_nodes, logger, dry_run)
+    if dry_run:
+        rel_i3d = os.path.relpath(i3d_path, mod_root)
+        if not renamed_nodes:
+            logger.log(f"ℹ️ i3d up to date: {rel_i3d}")
+        else:
+            logger.log(f"📝 Would rename {len(renamed_nodes)} node(s) in i3d: {rel_i3d}")
+            if diff:
+                with files.open(i3d_path) as reader:
+                    logger.log(i3d_rename_diff(reader, renamed_nodes, rel_i3d.replace(os.sep, "/")))
+    elif renamed_nodes:
+        with stats.phase("write"):
+            digest = files.patch_i3d(i3d_path, renamed_nodes, i3d_stat)
+        stats.count("i3d_files_written")
+        stats.count("bytes_out", files.stat(i3d_path).st_size)
+        logger.log(f"💾 Updated i3d file written: {os.path.relpath(i3d_path, mod_root)}")
+        # The renamed i3d maps to the same ids with nothing left to rename,
+        # unless a new name collided with an existing one.
+        if index.has_unique_names():
+            i3d_stat = files.stat(i3d_path)
+            if cache:
+                store_in_cache(cache, logger, i3d_path, i3d_stat, index, [], digest)
+            if sidecar:
+                store_sidecar(logger, i3d_path, i3d_stat, index, digest, files)
+    else:
+        logger.log(f"ℹ️ i3d unchanged, not rewritten: {os.path.relpath(i3d_path, mod_root)}")
+        if sidecar_index is None:
+            if digest is None and (sidecar or (cache and not cached)):
+                digest = files.digest(i3d_path)
+            if cache and not cached:
+                store_in_cache(cache, logger, i3d_path, i3d_stat, index, [], digest)
+            if sidecar:
+                store_sidecar(logger, i3d_path, i3d_stat, index, digest, files)
+
+    i3d_mapping.digest = digest
+    return i3d_mapping
+
+
+def apply_i3d_mapping(shop_xml, i3d_mapping: I3DMapping, logger: Logger):
+    """
+    Put the mapping into a parsed vehicle XML, rewrite its numeric node
+    references and remove memory usage tags.
+    """
+    stats = logger.stats
+    with stats.phase("rewrite_refs"):
+        map_cache = i3d_mapping.node_to_id
+        i3d_mapping_root = i3d_mapping.to_element(tree_backend(shop_xml).etree)
 
         existing_mappings = shop_xml.find(XPATH_I3D_MAPPINGS)
         if existing_mappings is not None:
-            log("✏️ Found existing <i3dMappings> — replacing contents.")
-            for child in list(existing_mappings):
-                existing_mappings.remove(child)
-            for map_item in i3d_mapping_root.findall(XPATH_I3D_MAPPING):
-                existing_mappings.append(map_item)
+            logger.log("✏️ Found existing <i3dMappings> — replacing contents.")
+            existing_mappings[:] = list(i3d_mapping_root)
         else:
-            log("➕ Adding new <i3dMappings> section.")
+            logger.log("➕ Adding new <i3dMappings> section.")
             shop_xml.append(i3d_mapping_root)
 
-        fix_count = 0
-        for this_tag in shop_xml.findall(XPATH_I3D_MAPPING):
-            node_index = this_tag.attrib.get("index")
-            if node_index and is_numeric_node(node_index) and node_index in map_cache:
-                this_tag.attrib["index"] = map_cache[node_index]
-                fix_count += 1
-        if fix_count:
-            log(f"🔧 Fixed {fix_count} i3dMapping index attribute(s).")
-
-        removed_memory_tags = 0
-        for tag_name in MEMORY_TAGS:
-            for elem in shop_xml.findall(f".//{tag_name}"):
-                for parent in shop_xml.iter():
-                    for child in list(parent):
-                        if child is elem:
-                            parent.remove(child)
-                            removed_memory_tags += 1
-                            break
-        if removed_memory_tags:
-            log(f"🧹 Removed {removed_memory_tags} memory usage tag(s).")
+        replaced, fix_count = replace_node_references(shop_xml, map_cache)
+    stats.count("replacements", sum(replaced.values()))
+    stats.count("index_fixes", fix_count)
+    logger.log(f"🔁 Replaced {sum(replaced.values())} numeric node reference(s) with i3dMapping IDs.")
+    for attr_name, count in replaced.most_common():
+        logger.log(f"  • {attr_name}: {count}")
+    if fix_count:
+        logger.log(f"🔧 Fixed {fix_count} i3dMapping index attribute(s).")
+
+    with stats.phase("cleanup"):
+        removed_memory_tags = remove_tags(shop_xml, MEMORY_TAGS)
+    stats.count("memory_tags_removed", removed_memory_tags)
+    if removed_memory_tags:
+        logger.log(f"🧹 Removed {removed_memory_tags} memory usage tag(s).")
+    else:
+        logger.log("🧹 No memory usage tags found to remove.")
+
+
+def serialize_vehicle_xml(shop_xml) -> str:
+    xml_output = tree_backend(shop_xml).tostring(shop_xml).replace("&gt;", ">")
+    return "<?xml version='1.0' encoding='utf-8'?>\n" + xml_output
+
+
+def vehicle_xml_bytes(shop_xml) -> bytes:
+    """Serialize a vehicle XML to the bytes written to disk, with platform line endings."""
+    return serialize_vehicle_xml(shop_xml).replace("\n", os.linesep).encode("utf-8")
+
+
+def file_matches(path: str, data: bytes, chunk_size: int = 1 << 20) -> bool:
+    """
+    Return True if the file at path holds exactly data.
+
+    The size is checked first, so a changed file is usually rejected
+    without being read; otherwise it is compared chunk by chunk.
+    """
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, "rb") as reader, memoryview(data) as view:
+            pos = 0
+            for chunk in iter(lambda: reader.read(chunk_size), b""):
+                if view[pos:pos + len(chunk)] != chunk:
+                    return False
+                pos += len(chunk)
+            return pos == len(data)
+    except OSError:
+        return False
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """Write data to path unless the file already holds it. Returns True if written."""
+    if file_matches(path, data):
+        return False
+    with open(path, "wb") as writer:
+        writer.write(data)
+    return True
+
+
+def update_vehicle_xml(xml_path: str, mod_root: str, shop_xml, i3d_mapping: I3DMapping, logger: Logger,
+                       *, dry_run: bool = False, diff: bool = False, files=FOLDER_FILES) -> bool:
+    """
+    Apply an i3d mapping to a parsed vehicle XML and write it back.
+
+    Returns False if the file already had this content and was left alone.
+    With dry_run the file is only compared, and diffed when diff is set.
+    """
+    rel_xml = os.path.relpath(xml_path, mod_root)
+
+    stats = logger.stats
+    apply_i3d_mapping(shop_xml, i3d_mapping, logger)
+    with stats.phase("serialize"):
+        data = vehicle_xml_bytes(shop_xml)
+    if dry_run:
+        if files.matches(xml_path, data):
+            logger.log(f"ℹ️ XML up to date: {rel_xml}")
+            return False
+        logger.log(f"📝 Would update XML: {rel_xml}")
+        if diff:
+            logger.log(xml_diff(files.read(xml_path), data, rel_xml.replace(os.sep, "/")))
+        return True
+    with stats.phase("write"):
+        written = files.write(xml_path, data)
+    if not written:
+        logger.log(f"ℹ️ XML unchanged, not rewritten: {rel_xml}")
+        logger.log("✅ Success. Mod XML already up to date.")
+        return False
+    stats.count("xml_files_written")
+    stats.count("bytes_out", len(data))
+    logger.log(f"💾 Updated XML file written: {rel_xml}")
+
+    logger.log("✅ Success. Mod XML and i3d updated.")
+    return True
+
+
+def process_xml(xml_path: str, mod_root: str, logger: Logger, cache=None, sidecar: bool = False,
+                backend=None, *, dry_run: bool = False, diff: bool = False):
+    """
+    Map the i3d of one vehicle XML and update the XML.
+
+    Returns a GroupResult for the XML; a skipped XML is in none of its lists.
+    With dry_run, updated lists the XML if it would be changed.
+    """
+    result = GroupResult(None, [xml_path])
+    try:
+        logger.section(f"🔍 Processing XML: {os.path.relpath(xml_path, mod_root)}")
+
+        shop_xml, i3d_path = load_vehicle_xml(xml_path, mod_root, logger, backend)
+        if shop_xml is None:
+            return result
+        result.i3d_path = i3d_path
+        logger.log(f"📄 i3d path resolved to: {os.path.relpath(i3d_path, mod_root)}")
+
+        i3d_mapping = map_i3d(i3d_path, mod_root, logger, cache, sidecar, previous_mappings([shop_xml]), backend,
+                              dry_run=dry_run, diff=diff)
+        if i3d_mapping is None:
+            result.failed.append(xml_path)
+            return result
+        result.mapped = True
+
+        if update_vehicle_xml(xml_path, mod_root, shop_xml, i3d_mapping, logger, dry_run=dry_run, diff=diff):
+            result.updated.append(xml_path)
         else:
-            log("🧹 No memory usage tags found to remove.")
+            result.unchanged.append(xml_path)
+
+    except Exception as e:
+        logger.error(f"❌ ERROR while processing {xml_path}: {str(e)}")
+        result.failed = [xml_path]
+    return result
 
 
-        i3d_output = ET.tostring(updated_i3d_xml.getroot(), encoding='unicode')
-        i3d_output = "<?xml version='1.0' encoding='utf-8'?>\n" + i3d_output
-        with open(i3d_path, "w", encoding='utf-8') as writer:
-            writer.write(i3d_output)
-        log(f"💾 Updated i3d file written: {os.path.relpath(i3d_path, mod_root)}")
+def group_vehicle_xmls(xml_paths, mod_root: str, logger: Logger, backend=None, *, files=FOLDER_FILES):
+    """
+    Load vehicle XMLs and group them by the i3d they reference.
+
+    Returns a dict of i3d_path -> [(xml_path, shop_xml), ...] in first-seen
+    order. XMLs listed more than once are only loaded once.
+    """
+    groups = {}
+    group_keys = {}
+    seen_xmls = set()
 
+    for xml_path in xml_paths:
+        xml_key = os.path.normcase(xml_path)
+        if xml_key in seen_xmls:
+            continue
+        seen_xmls.add(xml_key)
 
         try:
-            ET.indent(shop_xml, space="    ")
-        except AttributeError:
-            pass
+            shop_xml, i3d_path = load_vehicle_xml(xml_path, mod_root, logger, backend, files=files)
+        except Exception as e:
+            logger.error(f"❌ ERROR while reading {xml_path}: {str(e)}")
+            continue
+        if shop_xml is None:
+            continue
+        logger.log(f"📄 {os.path.relpath(xml_path, mod_root)} -> {os.path.relpath(i3d_path, mod_root)}")
+
+        i3d_path = group_keys.setdefault(os.path.normcase(i3d_path), i3d_path)
+        groups.setdefault(i3d_path, []).append((xml_path, shop_xml))
+
+    return groups
+
 
-        xml_output = ET.tostring(shop_xml, encoding='unicode').replace("&gt;", ">")
-        xml_output = "<?xml version='1.0' encoding='utf-8'?>\n" + xml_output
-        with open(xml_path, "w", encoding='utf-8') as writer:
-            writer.write(xml_output)
-        log(f"💾 Updated XML file written: {rel_xml}")
+@dataclass
+class GroupResult:
+    """Outcome of processing one i3d and the vehicle XMLs that use it."""
+    i3d_path: str
+    xml_paths: list
+    mapped: bool = False
+    updated: list = field(default_factory=list)
+    unchanged: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+    records: list = field(default_factory=list)
+    stats: object = None
+    i3d_digest: str = None
+    i3d_renamed: bool = False
+    writes: object = None
 
-        log("✅ Success. Mod XML and i3d updated.")
 
+def process_i3d_group(i3d_path: str, vehicles, mod_root: str, logger: Logger, cache=None,
+                      sidecar: bool = False, backend=None, *, dry_run: bool = False, diff: bool = False,
+                      known_digest=None, files=FOLDER_FILES) -> GroupResult:
+    """
+    Map a shared i3d once and apply the result to every XML using it.
+    known_digest is passed on to map_i3d().
+    """
+    result = GroupResult(i3d_path, [xml_path for xml_path, _ in vehicles])
+    rel_i3d = os.path.relpath(i3d_path, mod_root)
+    logger.section(f"🧩 Mapping i3d: {rel_i3d} ({len(vehicles)} XML file(s))")
+
+    try:
+        previous = previous_mappings(shop_xml for _, shop_xml in vehicles)
+        i3d_mapping = map_i3d(i3d_path, mod_root, logger, cache, sidecar, previous, backend, dry_run=dry_run, diff=diff,
+                              known_digest=known_digest, files=files)
     except Exception as e:
-        log(f"❌ ERROR while processing {xml_path}: {str(e)}")
+        logger.error(f"❌ ERROR while processing {i3d_path}: {str(e)}")
+        i3d_mapping = None
+    if i3d_mapping is None:
+        logger.log(f"⚠️ Skipping {len(vehicles)} XML file(s) that use {rel_i3d}.")
+        result.failed.extend(result.xml_paths)
+        return result
+    result.mapped = True
+    result.i3d_digest = i3d_mapping.digest
+    result.i3d_renamed = bool(i3d_mapping.renamed_nodes)
+
+    for xml_path, shop_xml in vehicles:
+        logger.section(f"🔍 Processing XML: {os.path.relpath(xml_path, mod_root)}")
+        try:
+            if update_vehicle_xml(xml_path, mod_root, shop_xml, i3d_mapping, logger, dry_run=dry_run, diff=diff,
+                                  files=files):
+                result.updated.append(xml_path)
+            else:
+                result.unchanged.append(xml_path)
+        except Exception as e:
+            logger.error(f"❌ ERROR while processing {xml_path}: {str(e)}")
+            result.failed.append(xml_path)
 
+    return result
 
-def process_moddesc(moddesc_path: str):
-    mod_root = os.path.dirname(moddesc_path)
 
-    log("")
-    log("====================================")
-    log(f"📦 Mod root: {mod_root}")
-    log("====================================")
+def _process_i3d_group_worker(i3d_path: str, vehicles, mod_root: str, cache=None,
+                              sidecar: bool = False, backend=None, *, dry_run: bool = False,
+                              diff: bool = False, known_digest=None, files=FOLDER_FILES) -> GroupResult:
+    """
+    Run process_i3d_group() in a pool worker, returning its log records and
+    the pending writes of files with the result. vehicles holds
+    (xml_path, data) pairs with the trees dumped by backend, since lxml
+    trees cannot be pickled.
+    """
+    logger = RecordingLogger()
+    backend = backend or get_backend()
+    vehicles = [(xml_path, backend.fromstring(data)) for xml_path, data in vehicles]
+    try:
+        result = process_i3d_group(i3d_path, vehicles, mod_root, logger, cache, sidecar, backend,
+                                   dry_run=dry_run, diff=diff, known_digest=known_digest, files=files)
+        result.writes = files.take_writes()
+    finally:
+        files.close()
+    result.records = logger.records
+    result.stats = logger.stats
+    return result
+
+
+def run_i3d_groups(groups, mod_root: str, logger: Logger, cache=None, jobs: int = 1, sidecar: bool = False,
+                   backend=None, *, dry_run: bool = False, diff: bool = False, digests=None, files=FOLDER_FILES):
+    """
+    Process i3d groups, fanning them out over a process pool when jobs > 1.
+
+    Results come back in the order of groups. Log lines recorded by the
+    workers are replayed as each group finishes, so log.txt reads the same
+    as a sequential run, and their pending writes are handed to files.
+    digests maps i3d paths to the known_digest passed to map_i3d().
+    """
+    digests = digests or {}
+    if jobs < 1:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(groups) < 2:
+        return [
+            process_i3d_group(i3d_path, vehicles, mod_root, logger, cache, sidecar, backend, dry_run=dry_run, diff=diff,
+                              known_digest=digests.get(i3d_path), files=files)
+            for i3d_path, vehicles in groups.items()
+        ]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    logger.log(f"🚀 Processing {len(groups)} i3d group(s) with {min(jobs, len(groups))} worker(s).")
+    results = []
+    with ProcessPoolExecutor(max_workers=min(jobs, len(groups))) as executor:
+        futures = []
+        for i3d_path, vehicles in groups.items():
+            dumped = [(xml_path, tree_backend(shop_xml).dumps(shop_xml)) for xml_path, shop_xml in vehicles]
+            futures.append((i3d_path, vehicles, executor.submit(
+                _process_i3d_group_worker, i3d_path, dumped, mod_root, cache, sidecar, backend,
+                dry_run=dry_run, diff=diff, known_digest=digests.get(i3d_path), files=files,
+            )))
+        for i3d_path, vehicles, future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"❌ ERROR while processing {i3d_path}: {str(e)}")
+                xml_paths = [xml_path for xml_path, _ in vehicles]
+                results.append(GroupResult(i3d_path, xml_paths, failed=list(xml_paths)))
+                continue
+            replay(result.records, logger)
+            logger.stats.merge(result.stats)
+            files.add_writes(result.writes)
+            result.records = []
+            result.stats = None
+            result.writes = None
+            results.append(result)
+
+    return results
+
+
+def moddesc_vehicle_xmls(moddesc_path: str, logger: Logger, backend=None, *, files=FOLDER_FILES):
+    """
+    Return the paths of the vehicle XMLs listed under <storeItems> that
+    exist, or None after logging why the modDesc has none.
+    """
+    mod_root = os.path.dirname(moddesc_path)
+    backend = backend or get_backend()
 
-    with open(moddesc_path, 'r', encoding='utf-8') as file:
-        content = file.read()
+    content = files.read(moddesc_path)
+    logger.stats.count("bytes_in", len(content))
 
     try:
-        moddesc_xml = ET.fromstring(content)
+        with logger.stats.phase("read"):
+            moddesc_xml = backend.fromstring(content)
     except Exception as e:
-        log(f"❌ Failed to parse modDesc: {str(e)}")
-        return
+        logger.error(f"❌ Failed to parse modDesc: {str(e)}")
+        return None
 
     store_items = moddesc_xml.findall(".//storeItems/storeItem")
     if not store_items:
-        log("⚠️ No <storeItems><storeItem> entries found in modDesc.")
-        return
+        logger.log("⚠️ No <storeItems><storeItem> entries found in modDesc.")
+        return None
 
-    log(f"🔎 Found {len(store_items)} storeItem entries.")
+    logger.log(f"🔎 Found {len(store_items)} storeItem entries.")
 
+    xml_paths = []
     for item in store_items:
         xml_filename = item.attrib.get("xmlFilename")
         if not xml_filename:
             continue
 
-        xml_path = clean_path(mod_root, xml_filename)
-        if not os.path.isfile(xml_path):
-            log(f"❌ Vehicle XML not found: {xml_path}")
+        xml_path = files.find(clean_path(mod_root, xml_filename))
+        if xml_path is None:
+            logger.error(f"❌ Vehicle XML not found: {clean_path(mod_root, xml_filename)}")
             continue
 
-        process_xml(xml_path, mod_root)
+        xml_paths.append(xml_path)
 
+    return xml_paths
 
-def main():
-    global CURRENT_MOD_ROOT
 
-    if len(sys.argv) < 2:
-        print("Drag and drop one or more XML files onto this script.")
-        print("Usage:")
-        print("  python rmc_i3d_mapper.py <file1.xml> <file2.xml> ...")
-        try:
-            input("\nPress Enter to exit...")
-        except EOFError:
-            pass
+def process_moddesc(moddesc_path: str, logger: Logger, cache=None, jobs: int = 1, sidecar: bool = False,
+                    backend=None, *, dry_run: bool = False, diff: bool = False, files=FOLDER_FILES):
+    """
+    Map every vehicle XML of a modDesc, through files. Pending writes are
+    committed before the mod graph is saved, so the graph never describes
+    files that were not written.
+    """
+    mod_root = os.path.dirname(moddesc_path)
+    backend = backend or get_backend()
+
+    logger.section(f"📦 Mod root: {mod_root}")
+
+    xml_paths = moddesc_vehicle_xmls(moddesc_path, logger, backend, files=files)
+    if xml_paths is None:
+        return []
+
+    groups = group_vehicle_xmls(xml_paths, mod_root, logger, backend, files=files)
+    logger.log(f"🗂️ {sum(len(vehicles) for vehicles in groups.values())} vehicle XML(s) use {len(groups)} i3d file(s).")
+
+    if cache is None:
+        results = run_i3d_groups(groups, mod_root, logger, cache, jobs, sidecar, backend, dry_run=dry_run, diff=diff,
+                                 files=files)
+        files.commit(logger, results, dry_run)
+        log_results_summary(results, logger, dry_run)
+        return results
+
+    graph, steps, run_groups, skipped = plan_moddesc(moddesc_path, groups, mod_root, logger, cache, sidecar, files)
+    start = time.perf_counter()
+    results = run_i3d_groups(run_groups, mod_root, logger, cache, jobs, sidecar, backend, dry_run=dry_run, diff=diff,
+                             digests=graph_i3d_digests(graph, run_groups, mod_root), files=files)
+    files.commit(logger, results, dry_run)
+    if not dry_run:
+        save_mod_graph(cache, graph, results, mod_root, steps, time.perf_counter() - start, files)
+    results += skipped
+    log_results_summary(results, logger, dry_run)
+    return results
+
+
+def log_results_summary(results, logger: Logger, dry_run: bool = False):
+    updated = sum(len(result.updated) for result in results)
+    unchanged = sum(len(result.unchanged) for result in results)
+    failed = sum(len(result.failed) for result in results)
+    logger.log("")
+    logger.log(f"📊 {updated} vehicle XML(s) {'to update' if dry_run else 'updated'}, {unchanged} unchanged, "
+               f"{failed} failed.")
+
+
+def log_stats(stats: Stats, logger: Logger):
+    """Log the phase timings and counters of a run as a table."""
+    report = stats.to_dict()
+    phase_total = sum(report["phases"].values()) or 1.0
+    logger.section(f"⏱️ Phase timings ({report['seconds']:.2f}s total)")
+    for name, seconds in report["phases"].items():
+        logger.log(f"  {name:<14} {seconds * 1000:>10.1f} ms  {seconds / phase_total * 100:5.1f}%")
+    if report["counters"]:
+        logger.log("🔢 Counters:")
+        for name, value in report["counters"].items():
+            logger.log(f"  {name:<20} {value:>12,}")
+
+
+def log_memory_trace(stats: Stats, logger: Logger, limit: int = 25):
+    """Log the top allocation sites recorded by --trace-memory for each traced phase."""
+    for name, sites in stats.allocations.items():
+        logger.section(f"🧠 Memory: {name} (peak +{stats.peaks[name] / 1024:,.1f} KiB)")
+        for site, size in sites.most_common(limit):
+            logger.log(f"  {size / 1024:>12,.1f} KiB  {site}")
+
+
+def write_profile(profiler, out_dir: str, limit: int = 25):
+    """
+    Write the cProfile data of a run into out_dir: a .pstats file for
+    tools like snakeviz and a text summary of the top entries.
+    Returns the two paths.
+    """
+    import io
+    import pstats
+
+    pstats_path = os.path.join(out_dir, PROFILE_FILE_NAME + ".pstats")
+    text_path = os.path.join(out_dir, PROFILE_FILE_NAME + ".txt")
+    profiler.dump_stats(pstats_path)
+
+    buffer = io.StringIO()
+    profile_stats = pstats.Stats(profiler, stream=buffer)
+    profile_stats.strip_dirs()
+    buffer.write(f"Top {limit} by cumulative time\n")
+    profile_stats.sort_stats("cumulative").print_stats(limit)
+    buffer.write(f"Top {limit} by own time\n")
+    profile_stats.sort_stats("tottime").print_stats(limit)
+    with open(text_path, "w", encoding="utf-8") as writer:
+        writer.write(buffer.getvalue())
+    return pstats_path, text_path
+
+
+def write_stats_report(path: str, entries):
+    """Write the stats of every processed mod as a JSON report."""
+    report = {
+        "generated": datetime.now().isoformat(timespec="seconds"),
+        "mods": list(entries),
+    }
+    with open(path, "w", encoding="utf-8") as writer:
+        json.dump(report, writer, indent=2)
+
+
+def is_mod_zip(path: str) -> bool:
+    return path.lower().endswith(".zip")
+
+
+def strip_zip64_extra(extra: bytes) -> bytes:
+    """Return a zip extra field without its zip64 record."""
+    kept = []
+    pos = 0
+    while pos + 4 <= len(extra):
+        field_id, size = struct.unpack("<HH", extra[pos:pos + 4])
+        if field_id != ZIP64_EXTRA_ID:
+            kept.append(extra[pos:pos + 4 + size])
+        pos += 4 + size
+    return b"".join(kept)
+
+
+def can_copy_zip_member_raw(source, info, target) -> bool:
+    """
+    Return True if copy_zip_member_raw() can copy the member.
+
+    It relies on ZipFile internals, so it is only used when they are there,
+    and not for encrypted or zip64 members, whose headers it cannot rewrite.
+    """
+    import zipfile
+
+    internals = ("fp", "filelist", "NameToInfo", "start_dir")
+    if not hasattr(source, "fp") or not all(hasattr(target, name) for name in internals):
+        return False
+    if info.flag_bits & ZIP_FLAG_ENCRYPTED:
+        return False
+    return max(info.file_size, info.compress_size, info.header_offset) < zipfile.ZIP64_LIMIT
+
+
+def copy_zip_member_raw(source, info, target):
+    """
+    Copy a member's compressed bytes from one ZipFile into another without
+    recompressing them.
+
+    zipfile has no public API for this, so the local header is written from
+    a copy of the member's ZipInfo and the entry is registered on the target
+    the same way ZipFile.write() does it. Check can_copy_zip_member_raw()
+    first.
+    """
+    import zipfile
+
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    source.fp.seek(info.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+
+    new_info = copy.copy(info)
+    new_info.flag_bits &= ~ZIP_FLAG_DATA_DESCRIPTOR
+    # FileHeader() adds its own zip64 record when one is needed.
+    new_info.extra = strip_zip64_extra(info.extra)
+    new_info.header_offset = target.fp.tell()
+    target.fp.write(new_info.FileHeader())
+
+    remaining = info.compress_size
+    while remaining:
+        chunk = source.fp.read(min(ZIP_COPY_CHUNK, remaining))
+        if not chunk:
+            raise ValueError(f"Truncated zip member: {info.filename}")
+        target.fp.write(chunk)
+        remaining -= len(chunk)
+
+    target.filelist.append(new_info)
+    target.NameToInfo[new_info.filename] = new_info
+    target.start_dir = target.fp.tell()
+
+
+def recompress_zip_member(source, info, target):
+    """Copy a member from one ZipFile into another by decompressing and compressing it again."""
+    import zipfile
+
+    new_info = zipfile.ZipInfo(info.filename, info.date_time)
+    new_info.compress_type = info.compress_type
+    new_info.external_attr = info.external_attr
+    new_info.create_system = info.create_system
+    new_info.comment = info.comment
+    if info.is_dir():
+        target.writestr(new_info, b"")
         return
+    force_zip64 = info.file_size >= zipfile.ZIP64_LIMIT
+    with source.open(info) as reader, target.open(new_info, "w", force_zip64=force_zip64) as writer:
+        shutil.copyfileobj(reader, writer, ZIP_COPY_CHUNK)
 
-    processed_any = False
 
-    for input_path in sys.argv[1:]:
-        input_path = os.path.abspath(input_path)
+def write_mod_zip(archive, target_path: str, pending, logger: Logger):
+    """
+    Write a copy of archive to target_path with the pending members of a
+    ZipModFiles.
 
-        if not os.path.isfile(input_path):
-            print(f"❌ File not found: {input_path}")
+    Unchanged members are copied with their compressed bytes as they are
+    where possible; updated members, and members that cannot be copied raw,
+    are compressed again, and new members are added at the end. Returns the
+    names of the members copied raw.
+    """
+    import zipfile
+
+    updates = {member.name: member for member in pending.values()}
+    copied = []
+    recompressed = len(updates)
+    with zipfile.ZipFile(target_path, "w") as target:
+        target.comment = archive.comment
+        for info in archive.infolist():
+            member = updates.pop(info.filename, None)
+            if member is not None:
+                new_info = zipfile.ZipInfo(info.filename, time.localtime()[:6])
+                new_info.compress_type = info.compress_type
+                new_info.external_attr = info.external_attr
+                new_info.create_system = info.create_system
+                if member.data is not None:
+                    target.writestr(new_info, member.data)
+                else:
+                    with archive.open(info) as reader, target.open(new_info, "w", force_zip64=True) as writer:
+                        splice_i3d_names(reader, writer, member.renamed_nodes)
+            elif can_copy_zip_member_raw(archive, info, target):
+                copy_zip_member_raw(archive, info, target)
+                copied.append(info.filename)
+            else:
+                recompress_zip_member(archive, info, target)
+                recompressed += 1
+        for member in updates.values():
+            target.writestr(member.name, member.data, zipfile.ZIP_DEFLATED)
+
+    logger.log(f"💾 {recompressed} member(s) recompressed, {len(copied)} copied unchanged.")
+    return copied
+
+
+def verify_mod_zip(zip_path: str, source, copied):
+    """
+    Check a written archive before it replaces source: every member must
+    pass testzip(), and the members in copied, which copy_zip_member_raw()
+    wrote, must have the size, compressed size and CRC-32 they have in
+    source. testzip() checks the content against that CRC, so they hold
+    the same bytes as in source.
+    """
+    import zipfile
+
+    with zipfile.ZipFile(zip_path) as written:
+        bad_member = written.testzip()
+        if bad_member is not None:
+            raise ValueError(f"Written archive fails its CRC check at: {bad_member}")
+        for name in copied:
+            old, new = source.getinfo(name), written.getinfo(name)
+            if (new.file_size, new.compress_size, new.CRC) != (old.file_size, old.compress_size, old.CRC):
+                raise ValueError(f"Member changed while copying: {name}")
+
+
+@dataclass
+class PendingMember:
+    """
+    A member a ZipModFiles will write: either data, or the renames spliced
+    into the current member. size, crc and digest describe the new content.
+    """
+    name: str
+    size: int
+    crc: int
+    digest: str
+    data: bytes = None
+    renamed_nodes: list = None
+
+
+@dataclass
+class MemberStat:
+    """The stat() of a zip member, with its CRC-32 standing in for the mtime."""
+    st_size: int
+    st_mtime_ns: int
+
+
+class ChecksumWriter:
+    """A write-only sink that keeps the size, CRC-32 and blake2b digest of what it is given."""
+
+    def __init__(self):
+        self.size = 0
+        self.crc = 0
+        self.digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+
+    def write(self, data):
+        self.size += len(data)
+        self.crc = zlib.crc32(data, self.crc)
+        self.digest.update(data)
+        return len(data)
+
+
+class ZipModFiles(ModFiles):
+    """
+    ModFiles of a zipped mod, read straight from the archive.
+
+    A member is addressed by the path it would have if the zip were a
+    folder (zip_path/xml/tractor.xml), so mod-relative paths work as for
+    folders, and is looked up ignoring case like the game does on Windows.
+    Writes are kept as PendingMembers until commit() writes a new archive
+    that replaces the zip.
+
+    stat() reports a member's size with its CRC-32 as st_mtime_ns. Both are
+    known for a pending member before the archive exists, and the CRC
+    changes with the content, so the cache, sidecars and planner compare
+    members the way they compare files.
+    """
+
+    def __init__(self, zip_path: str):
+        self.zip_path = zip_path
+        self._archive = None
+        self._load()
+
+    def _load(self):
+        self.infos = {}
+        self.pending = {}
+        for info in self.archive().infolist():
+            if not info.is_dir():
+                self.infos.setdefault(info.filename.lower(), info)
+
+    def __getstate__(self):
+        return {"zip_path": self.zip_path}
+
+    def __setstate__(self, state):
+        self.__init__(state["zip_path"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def archive(self):
+        if self._archive is None:
+            import zipfile
+
+            self._archive = zipfile.ZipFile(self.zip_path)
+        return self._archive
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.zip_path, *name.split("/"))
+
+    def moddesc_path(self):
+        """Return the path of the shallowest modDesc.xml in the archive, or None."""
+        names = [info.filename for lower, info in self.infos.items() if posixpath.basename(lower) == "moddesc.xml"]
+        if not names:
+            return None
+        return self.path(min(names, key=lambda name: name.count("/")))
+
+    def _key(self, path: str):
+        rel = os.path.relpath(path, self.zip_path)
+        if rel == os.curdir or rel.split(os.sep)[0] == os.pardir:
+            return None
+        return rel.replace(os.sep, "/").lower()
+
+    def _lookup(self, path: str):
+        key = self._key(path)
+        member = self.pending.get(key) or self.infos.get(key)
+        if member is None:
+            raise FileNotFoundError(f"Not found in archive: {path}")
+        return key, member
+
+    def find(self, path: str):
+        try:
+            _, member = self._lookup(path)
+        except FileNotFoundError:
+            return None
+        return self.path(member.name if isinstance(member, PendingMember) else member.filename)
+
+    def open(self, path: str):
+        import io
+
+        _, member = self._lookup(path)
+        if not isinstance(member, PendingMember):
+            return self.archive().open(member.filename)
+        if member.data is not None:
+            return io.BytesIO(member.data)
+        buffer = io.BytesIO()
+        with self.archive().open(member.name) as reader:
+            splice_i3d_names(reader, buffer, member.renamed_nodes)
+        buffer.seek(0)
+        return buffer
+
+    def stat(self, path: str):
+        _, member = self._lookup(path)
+        if isinstance(member, PendingMember):
+            return MemberStat(member.size, member.crc)
+        return MemberStat(member.file_size, member.CRC)
+
+    def digest(self, path: str) -> str:
+        _, member = self._lookup(path)
+        if isinstance(member, PendingMember):
+            return member.digest
+        with self.open(path) as reader:
+            return stream_digest(reader)
+
+    def matches(self, path: str, data: bytes) -> bool:
+        try:
+            stat = self.stat(path)
+        except FileNotFoundError:
+            return False
+        if (stat.st_size, stat.st_mtime_ns) != (len(data), zlib.crc32(data)):
+            return False
+        return self.read(path) == data
+
+    def write(self, path: str, data: bytes) -> bool:
+        if self.matches(path, data):
+            return False
+        self.replace(path, data)
+        return True
+
+    def replace(self, path: str, data: bytes):
+        found = self.find(path)
+        name = os.path.relpath(found or path, self.zip_path).replace(os.sep, "/")
+        self.pending[name.lower()] = PendingMember(
+            name, len(data), zlib.crc32(data), hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest(), data=data,
+        )
+
+    def patch_i3d(self, i3d_path: str, renamed_nodes, expected_stat=None) -> str:
+        """
+        Record the renames of an i3d member. The i3d is streamed once to
+        work out the new size, CRC and digest; the renames are spliced in
+        again when the archive is written.
+        """
+        key, member = self._lookup(i3d_path)
+        current = self.stat(i3d_path)
+        if expected_stat is not None and \
+                (current.st_size, current.st_mtime_ns) != (expected_stat.st_size, expected_stat.st_mtime_ns):
+            raise RuntimeError(f"i3d changed while processing: {i3d_path}")
+        checksum = ChecksumWriter()
+        with self.open(i3d_path) as reader:
+            splice_i3d_names(reader, checksum, renamed_nodes)
+        name = member.name if isinstance(member, PendingMember) else member.filename
+        self.pending[key] = PendingMember(name, checksum.size, checksum.crc, checksum.digest.hexdigest(),
+                                          renamed_nodes=list(renamed_nodes))
+        return self.pending[key].digest
+
+    def take_writes(self):
+        pending, self.pending = self.pending, {}
+        return pending
+
+    def add_writes(self, writes):
+        self.pending.update(writes or {})
+
+    def commit(self, logger, results, dry_run: bool = False):
+        """
+        Write the pending members into a copy of the archive, check the
+        copy with verify_mod_zip() and let it replace the zip. A dry run
+        has nothing pending and only reports whether results would change it.
+        """
+        logger.log("")
+        if dry_run:
+            if any(result.updated or result.i3d_renamed for result in results):
+                logger.log(f"📝 Archive would be rewritten: {self.zip_path}")
+            else:
+                logger.log(f"ℹ️ Archive up to date: {self.zip_path}")
+            return
+        if not self.pending:
+            logger.log(f"ℹ️ Archive unchanged, not rewritten: {self.zip_path}")
+            return
+
+        tmp_path = self.zip_path + ".tmp"
+        try:
+            with logger.stats.phase("write"):
+                copied = write_mod_zip(self.archive(), tmp_path, self.pending, logger)
+                verify_mod_zip(tmp_path, self.archive(), copied)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.close()
+        os.replace(tmp_path, self.zip_path)
+        self._load()
+        logger.log(f"💾 Updated archive written: {self.zip_path}")
+
+
+def process_mod_zip(zip_path: str, logger: Logger, cache=None, jobs: int = 1, sidecar: bool = False,
+                    backend=None, *, dry_run: bool = False, diff: bool = False):
+    """
+    Process a zipped mod without extracting it.
+
+    The modDesc is run through process_moddesc() on a ZipModFiles, so the
+    vehicle XMLs and i3ds are streamed out of the archive and the result
+    replaces the zip once everything has been mapped. With dry_run the zip
+    is left alone and the changes are only reported.
+    """
+    logger.section(f"📦 Mod archive: {zip_path}")
+    with ZipModFiles(zip_path) as files:
+        moddesc_path = files.moddesc_path()
+        if moddesc_path is None:
+            logger.error("❌ No modDesc.xml found in archive.")
+            return []
+        return process_moddesc(moddesc_path, logger, cache, jobs, sidecar, backend, dry_run=dry_run, diff=diff,
+                               files=files)
+
+
+def find_mods(root_dir: str):
+    """
+    Yield every modDesc.xml and mod zip below root_dir, in sorted order.
+
+    Uses os.scandir and stops descending once a folder holding a modDesc is
+    found, since mods do not nest. Hidden folders (.git, the mapping cache)
+    are skipped.
+    """
+    stack = [root_dir]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda entry: entry.name.lower())
+        except OSError:
             continue
 
-        filename_lower = os.path.basename(input_path).lower()
-        mod_root = find_mod_root(input_path)
+        moddesc = next(
+            (entry for entry in entries
+             if entry.name.lower() == "moddesc.xml" and entry.is_file()),
+            None,
+        )
+        if moddesc is not None:
+            yield moddesc.path
+            continue
 
-        if mod_root != CURRENT_MOD_ROOT:
-            init_logger(mod_root)
-            log(f"Detected mod root: {mod_root}")
+        for entry in entries:
+            if is_mod_zip(entry.name) and entry.is_file():
+                yield entry.path
 
-        if filename_lower == "moddesc.xml":
-            log(f"Processing modDesc: {input_path}")
-            process_moddesc(input_path)
-            processed_any = True
+        stack.extend(
+            entry.path for entry in reversed(entries)
+            if entry.is_dir() and not entry.name.startswith(".")
+        )
+
+
+@dataclass
+class ModResult:
+    """Outcome of processing one mod in a mods-folder batch."""
+    mod_root: str
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    error: str = ""
+    stats: dict = None
+
+
+def zip_log_name(zip_path: str) -> str:
+    return os.path.splitext(os.path.basename(zip_path))[0] + ".log.txt"
+
+
+def process_mod(mod_path: str, quiet: bool = False, use_cache: bool = True, jobs: int = 1,
+                sidecar: bool = False, backend=None, stats: bool = False, top: int = 25,
+                dry_run: bool = False, diff: bool = False) -> ModResult:
+    """
+    Process one mod, given as its modDesc.xml or its zip, in a Mapper of
+    its own, timing the whole run. Used for the workers of a mods folder.
+    """
+    with Mapper(use_cache=use_cache, sidecar=sidecar, jobs=jobs, backend=backend, quiet=quiet,
+                stats=stats, top=top, dry_run=dry_run, diff=diff) as mapper:
+        return mapper.process_mod(mod_path)
+
+
+def process_mods_folder(root_dir: str, mapper):
+    """
+    Process every mod found below root_dir with the settings of mapper and
+    print one summary.
+
+    With mapper.jobs > 1 whole mods are spread over a process pool; their
+    console output is suppressed and each mod's log.txt is still written.
+    Otherwise the mods run in mapper itself and share its warm caches.
+    """
+    jobs = mapper.jobs
+    moddesc_paths = list(find_mods(root_dir))
+    print(f"📚 Found {len(moddesc_paths)} mod(s) below {root_dir}")
+    if not moddesc_paths:
+        return []
+
+    if jobs < 1:
+        jobs = os.cpu_count() or 1
+
+    start = time.perf_counter()
+    results = []
+    if jobs == 1 or len(moddesc_paths) < 2:
+        for moddesc_path in moddesc_paths:
+            results.append(mapper.process_mod(moddesc_path))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(jobs, len(moddesc_paths))) as executor:
+            futures = [
+                executor.submit(process_mod, moddesc_path, **mapper.worker_config())
+                for moddesc_path in moddesc_paths
+            ]
+            for moddesc_path, future in zip(moddesc_paths, futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = ModResult(os.path.dirname(moddesc_path), error=str(e))
+                print(f"  {'❌' if result.error or result.errors else '✅'} "
+                      f"{os.path.relpath(result.mod_root, root_dir)} ({result.seconds:.2f}s)")
+                if result.stats:
+                    mapper.reports.append({"mod_root": result.mod_root, **result.stats})
+                mapper.errors += max(result.errors, 1 if result.error else 0)
+                results.append(result)
+
+    print_batch_summary(results, root_dir, time.perf_counter() - start, mapper.dry_run)
+    return results
+
+
+def print_batch_summary(results, root_dir: str, seconds: float, dry_run: bool = False):
+    names = [os.path.relpath(result.mod_root, root_dir) for result in results]
+    width = max(len(name) for name in names)
+
+    print("")
+    print("====================================")
+    print(f"📚 Batch summary: {len(results)} mod(s) in {seconds:.2f}s")
+    print("====================================")
+    updated_label = "to update" if dry_run else "updated"
+    for name, result in zip(names, results):
+        if result.error:
+            status = f"ERROR: {result.error}"
         else:
-            log(f"Processing vehicle XML: {input_path}")
-            process_xml(input_path, mod_root)
-            processed_any = True
+            status = (f"{result.updated} {updated_label}, {result.unchanged} unchanged, "
+                      f"{result.failed} failed, {result.errors} error(s)")
+        print(f"  {name:<{width}}  {result.seconds:8.2f}s  {status}")
 
-    if not processed_any:
-        print("No valid XML files processed.")
+    updated = sum(result.updated for result in results)
+    unchanged = sum(result.unchanged for result in results)
+    failed = sum(result.failed for result in results)
+    with_errors = sum(1 for result in results if result.error or result.errors)
+    print(f"📊 {updated} vehicle XML(s) {updated_label}, {unchanged} unchanged, {failed} failed, "
+          f"{with_errors} mod(s) with errors.")
+
+
+class Mapper:
+    """
+    Reusable mapping session for build systems and other long-lived callers.
+
+    A Mapper holds the settings of a run plus one logger and one mapping
+    cache per mod root, and keeps them between calls. Repeated calls for
+    the same mod therefore share one log.txt and a warm in-memory cache.
+    map_i3d(), process_vehicle_xml(), process_vehicle_xmls() and
+    process_mod() return result objects instead of printing a summary, and errors counts the errors
+    logged by all calls so far.
+
+    At most MAX_OPEN_LOGS logs are open at once; older ones are closed
+    and continued in append mode when their mod comes back. On close, each
+    log gets its --stats table and memory trace, and an entry in reports.
+    The caches share one in-memory LRU, so the session keeps at most
+    CACHE_MEMORY_ENTRIES mappings in memory however many mods it sees.
+
+    A Mapper is meant to be used from one thread at a time: each call
+    swaps its own Stats into the mod's logger, so concurrent calls for the
+    same mod would count into each other's results.
+
+    A dry_run session never opens a file for writing: logs only go to the
+    console, the cache is read-only and results list what would change,
+    with unified diffs in the log when diff is set.
+
+        with Mapper(jobs=4) as mapper:
+            for moddesc_path in moddesc_paths:
+                result = mapper.process_mod(moddesc_path)
+    """
+
+    def __init__(self, use_cache: bool = True, sidecar: bool = False, jobs: int = 1, backend="auto",
+                 quiet: bool = False, stats: bool = False, top: int = 25, dry_run: bool = False,
+                 diff: bool = False):
+        self.use_cache = use_cache
+        self.sidecar = sidecar
+        self.jobs = jobs
+        self.backend = get_backend(backend) if isinstance(backend, str) else (backend or get_backend())
+        self.quiet = quiet
+        self.stats = stats
+        self.top = top
+        self.dry_run = dry_run
+        self.diff = diff
+        self.reports = []
+        self.errors = 0
+        self.last_logger = None
+        self._loggers = OrderedDict()
+        self._labels = {}
+        self._caches = {}
+        self._cache_memory = OrderedDict()
+
+    def worker_config(self) -> dict:
+        """Settings for process_mod() in a pool worker."""
+        return dict(use_cache=self.use_cache, sidecar=self.sidecar, backend=self.backend,
+                    quiet=True, stats=self.stats, top=self.top, dry_run=self.dry_run, diff=self.diff)
+
+    def logger_for(self, log_dir: str, log_name: str = LOG_FILE_NAME, label=None) -> Logger:
+        """Return the open log in log_dir, opening or reopening it on first use."""
+        log_path = os.path.join(log_dir, log_name)
+        logger = self._loggers.get(log_path)
+        if logger is None:
+            reopened = log_path in self._labels
+            if self.dry_run:
+                logger = Logger(quiet=self.quiet)
+            else:
+                logger = init_logger(log_dir, self.quiet, log_name, append=reopened)
+            if not reopened and log_name == LOG_FILE_NAME:
+                logger.log(f"Detected mod root: {log_dir}")
+                logger.log(f"Parser backend: {self.backend.name}")
+            self._labels[log_path] = label or log_dir
+            self._loggers[log_path] = logger
+            while len(self._loggers) > MAX_OPEN_LOGS:
+                self._close_logger(next(iter(self._loggers)))
+        self._loggers.move_to_end(log_path)
+        self.last_logger = logger
+        return logger
+
+    def cache_for(self, mod_root: str):
+        """
+        Return the cache of a mod root. Zipped mods share the cache of the
+        folder holding them, each with a graph of its own.
+        """
+        if not self.use_cache:
+            return None
+        cache = self._caches.get(mod_root)
+        if cache is None:
+            if is_mod_zip(mod_root):
+                cache = MappingCache(os.path.dirname(mod_root), read_only=self.dry_run, memory=self._cache_memory,
+                                     graph_name=f"{os.path.basename(mod_root)}.{GRAPH_FILE_NAME}")
+            else:
+                cache = MappingCache(mod_root, read_only=self.dry_run, memory=self._cache_memory)
+            self._caches[mod_root] = cache
+        return cache
+
+    @contextmanager
+    def _call(self, log_dir: str, log_name: str = LOG_FILE_NAME, label=None):
+        # Each call collects its own Stats, which are then added to the log's.
+        logger = self.logger_for(log_dir, log_name, label)
+        log_stats_total = logger.swap_stats(Stats())
+        errors_before = logger.error_count
+        try:
+            yield logger
+        finally:
+            log_stats_total.merge(logger.swap_stats(log_stats_total))
+            self.errors += logger.error_count - errors_before
+
+    def map_i3d(self, i3d_path: str, mod_root=None, previous=None):
+        """Map one i3d and write its renames; returns the I3DMapping or None."""
+        i3d_path = os.path.abspath(i3d_path)
+        mod_root = mod_root or find_mod_root(i3d_path)
+        with self._call(mod_root) as logger:
+            logger.section(f"🧩 Mapping i3d: {os.path.relpath(i3d_path, mod_root)}")
+            try:
+                return map_i3d(i3d_path, mod_root, logger, self.cache_for(mod_root), self.sidecar, previous,
+                               self.backend, dry_run=self.dry_run, diff=self.diff)
+            except Exception as e:
+                logger.error(f"❌ ERROR while processing {i3d_path}: {str(e)}")
+                return None
+
+    def process_vehicle_xml(self, xml_path: str) -> GroupResult:
+        """Map the i3d of one vehicle XML and update the XML."""
+        xml_path = os.path.abspath(xml_path)
+        mod_root = find_mod_root(xml_path)
+        with self._call(mod_root) as logger:
+            logger.log(f"Processing vehicle XML: {xml_path}")
+            return process_xml(xml_path, mod_root, logger, self.cache_for(mod_root), self.sidecar, self.backend,
+                               dry_run=self.dry_run, diff=self.diff)
+
+    def process_vehicle_xmls(self, xml_paths):
+        """
+        Process vehicle XMLs, mapping each i3d once for all the given XMLs
+        that use it; returns one GroupResult per i3d.
+        """
+        by_root = {}
+        for xml_path in xml_paths:
+            xml_path = os.path.abspath(xml_path)
+            by_root.setdefault(find_mod_root(xml_path), []).append(xml_path)
+
+        results = []
+        for mod_root, paths in by_root.items():
+            with self._call(mod_root) as logger:
+                logger.section(f"🗂️ Processing {len(paths)} vehicle XML(s) in: {mod_root}")
+                groups = group_vehicle_xmls(paths, mod_root, logger, self.backend)
+                results.extend(run_i3d_groups(groups, mod_root, logger, self.cache_for(mod_root), self.jobs,
+                                              self.sidecar, self.backend, dry_run=self.dry_run, diff=self.diff))
+        return results
+
+    def process_mod(self, mod_path: str) -> ModResult:
+        """Process one mod, given as its modDesc.xml or its zip."""
+        mod_path = os.path.abspath(mod_path)
+        if is_mod_zip(mod_path):
+            mod_root = mod_path
+            call = self._call(os.path.dirname(mod_path), zip_log_name(mod_path), mod_path)
+        else:
+            mod_root = os.path.dirname(mod_path)
+            call = self._call(mod_root)
+        result = ModResult(mod_root)
+        start = time.perf_counter()
+
+        with call as logger:
+            errors_before = logger.error_count
+            try:
+                if is_mod_zip(mod_path):
+                    group_results = process_mod_zip(mod_path, logger, self.cache_for(mod_root), self.jobs,
+                                                    self.sidecar, self.backend, dry_run=self.dry_run, diff=self.diff)
+                else:
+                    logger.log(f"Processing modDesc: {mod_path}")
+                    group_results = process_moddesc(mod_path, logger, self.cache_for(mod_root), self.jobs,
+                                                    self.sidecar, self.backend, dry_run=self.dry_run, diff=self.diff)
+                result.updated = sum(len(group.updated) for group in group_results)
+                result.unchanged = sum(len(group.unchanged) for group in group_results)
+                result.failed = sum(len(group.failed) for group in group_results)
+            except Exception as e:
+                logger.error(f"❌ ERROR while processing {mod_path}: {str(e)}")
+                result.error = str(e)
+            result.errors = logger.error_count - errors_before
+            result.stats = logger.stats.to_dict()
+
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def process_folder(self, root_dir: str):
+        """Process every mod below root_dir; returns one ModResult per mod."""
+        return process_mods_folder(os.path.abspath(root_dir), self)
+
+    def _close_logger(self, log_path: str, footer=None):
+        logger = self._loggers.pop(log_path)
+        if self.stats:
+            log_stats(logger.stats, logger)
+        if logger.stats.allocations:
+            log_memory_trace(logger.stats, logger, self.top)
+        self.reports.append({"mod_root": self._labels[log_path], **logger.stats.to_dict()})
+        if logger is self.last_logger:
+            if footer:
+                logger.write(footer)
+            self.last_logger = None
+        logger.close()
+
+    def flush(self):
+        """Flush the open logs, so they can be read while the session goes on."""
+        for logger in self._loggers.values():
+            logger.flush()
+
+    def close(self, footer=None):
+        """Close every log; footer is written at the end of the last one used."""
+        while self._loggers:
+            self._close_logger(next(iter(self._loggers)), footer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def file_signature(path: str):
+    """Return (size, mtime_ns) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class Watcher:
+    """
+    Poll mods for changes and remap only the vehicle XMLs they affect.
+
+    The watcher keeps the dependency graph modDesc -> vehicle XML -> i3d
+    in memory and compares the size and mtime of every file in it on each
+    poll; nothing but os.stat is used, so it works on any OS and on
+    network drives. Changes are collected until no file has changed for
+    debounce seconds, so the burst of writes of one editor export is
+    handled once. Then:
+
+    - a changed modDesc is re-read and its new vehicle XMLs are mapped,
+    - a changed vehicle XML is re-read (its i3d may have moved) and mapped,
+    - a changed i3d remaps every vehicle XML that uses it.
+
+    The XMLs to remap are grouped by i3d as in a full run, so a shared i3d
+    is mapped once with the previous mappings of all its XMLs. All work
+    goes through one Mapper, so its logs stay open and unchanged
+    i3ds are answered from its warm in-memory cache. Only the files a
+    round wrote itself are taken into the file signatures afterwards, so
+    they do not trigger another round; any other file saved while a round
+    runs is picked up by the next poll.
+    """
+
+    def __init__(self, mapper: Mapper, moddesc_paths, interval: float = 1.0, debounce: float = 2.0):
+        self.mapper = mapper
+        self.interval = interval
+        self.debounce = debounce
+        self.moddescs = {}
+        self.xml_i3ds = {}
+        self._signatures = {}
+        # Graph scans only need the paths; problems are logged by the mapping run.
+        self._scan_logger = RecordingLogger()
+        for moddesc_path in moddesc_paths:
+            self.scan_moddesc(os.path.abspath(moddesc_path))
+        self.snapshot(self.watched_files())
+
+    def scan_moddesc(self, moddesc_path: str):
+        """
+        Re-read the storeItems of a modDesc and the i3d of each of its XMLs.
+        XMLs no longer listed by any modDesc are dropped from the graph.
+        """
+        dropped = set(self.moddescs.get(moddesc_path, ()))
+        xml_paths = moddesc_vehicle_xmls(moddesc_path, self._scan_logger, self.mapper.backend) or []
+        self.moddescs[moddesc_path] = xml_paths
+        for listed in self.moddescs.values():
+            dropped.difference_update(listed)
+        for xml_path in dropped:
+            self.xml_i3ds.pop(xml_path, None)
+            self._signatures.pop(xml_path, None)
+        for xml_path in xml_paths:
+            self.scan_xml(xml_path)
+        return xml_paths
+
+    def scan_xml(self, xml_path: str):
+        """Re-read which i3d a vehicle XML uses."""
+        i3d_path = None
         try:
-            input("\nPress Enter to exit...")
-        except EOFError:
+            shop_xml = self.mapper.backend.parse_file(xml_path)
+            mod_root = find_mod_root(xml_path)
+            i3d_filename = vehicle_i3d_filename(shop_xml, xml_path, self._scan_logger)
+            if i3d_filename:
+                i3d_path = clean_path(mod_root, i3d_filename)
+        except Exception:
             pass
-        return
+        self.xml_i3ds[xml_path] = i3d_path
+
+    def watched_files(self):
+        files = set(self.moddescs)
+        for xml_paths in self.moddescs.values():
+            files.update(xml_paths)
+        files.update(i3d_path for i3d_path in self.xml_i3ds.values() if i3d_path)
+        return files
+
+    def snapshot(self, paths):
+        for path in paths:
+            self._signatures[path] = file_signature(path)
+
+    def poll(self):
+        """Return the watched files whose size or mtime changed since the last poll."""
+        changed = set()
+        for path in self.watched_files():
+            signature = file_signature(path)
+            if signature != self._signatures.get(path):
+                self._signatures[path] = signature
+                changed.add(path)
+        return changed
+
+    def affected_xmls(self, changed):
+        """Update the graph for changed files and return the vehicle XMLs to remap."""
+        xml_paths = set()
+        for path in changed:
+            if path in self.moddescs:
+                known = set(self.moddescs[path])
+                xml_paths.update(xml_path for xml_path in self.scan_moddesc(path) if xml_path not in known)
+        for path in changed:
+            if path in self.xml_i3ds and os.path.isfile(path):
+                self.scan_xml(path)
+                xml_paths.add(path)
+        for xml_path, i3d_path in self.xml_i3ds.items():
+            if i3d_path in changed and os.path.isfile(xml_path):
+                xml_paths.add(xml_path)
+        return sorted(xml_paths)
+
+    def process_changes(self, changed):
+        """Remap what changed files affect; returns the GroupResults."""
+        xml_paths = self.affected_xmls(changed)
+        # Files the rescan just added to the graph start from their state now.
+        self.snapshot([path for path in self.watched_files() if path not in self._signatures])
+        names = ", ".join(sorted(os.path.basename(path) for path in changed))
+        if not xml_paths:
+            print(f"🔄 Changed: {names}; no vehicle XML affected.")
+            return []
+
+        print(f"🔄 Changed: {names}; remapping {len(xml_paths)} vehicle XML(s).")
+        start = time.perf_counter()
+        errors_before = self.mapper.errors
+        results = self.mapper.process_vehicle_xmls(xml_paths)
+        self.mapper.flush()
+        # Take in only the files written by the mapping run itself.
+        written = set()
+        for result in results:
+            written.update(result.updated)
+            if result.i3d_renamed:
+                written.add(result.i3d_path)
+        self.snapshot(written)
+
+        updated = sum(len(result.updated) for result in results)
+        errors = self.mapper.errors - errors_before
+        print(f"{'❌' if errors else '✅'} {updated} vehicle XML(s) updated, {errors} error(s) "
+              f"in {time.perf_counter() - start:.2f}s.")
+        return results
+
+    def run(self):
+        """Poll until interrupted with Ctrl+C."""
+        print(f"👀 Watching {len(self.watched_files())} file(s) of {len(self.moddescs)} mod(s). "
+              f"Press Ctrl+C to stop.")
+        pending = set()
+        last_change = 0.0
+        try:
+            while True:
+                changed = self.poll()
+                now = time.monotonic()
+                if changed:
+                    pending |= changed
+                    last_change = now
+                elif pending and now - last_change >= self.debounce:
+                    self.process_changes(pending)
+                    pending = set()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            print("👋 Stopped watching.")
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line. Without a command the paths are mapped, so
+    files dropped onto the script still work; args.implicit is then set.
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    implicit = bool(argv) and argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")
+    if implicit:
+        argv.insert(0, "map")
+
+    parser = argparse.ArgumentParser(
+        description="Generate <i3dMappings>, rename duplicate i3d nodes and clean vehicle XMLs.",
+        epilog="Without a command the paths are mapped, as with map. Exit status: 0 ok, 1 errors, "
+               "2 usage error, 3 check found XMLs that need mapping.",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
 
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--backend", choices=["auto", *BACKEND_CLASSES], default="auto",
+        help="XML parser to use; auto picks lxml when it is installed and the standard library otherwise",
+    )
+    common.add_argument(
+        "-q", "--quiet", action="store_true",
+        help="only print errors to the console; log.txt is still written in full",
+    )
+    common.add_argument(
+        "--no-pause", action="store_true",
+        help="do not wait for Enter before exiting (never done when stdin is not a terminal)",
+    )
 
-if __name__ == "__main__":
-    main()
+    pipeline = argparse.ArgumentParser(add_help=False)
+    pipeline.add_argument(
+        "--no-cache", action="store_true",
+        help=f"do not read or write the {CACHE_DIR_NAME} mapping cache in the mod root",
+    )
+    pipeline.add_argument(
+        "--stats", action="store_true",
+        help="log per-phase timings and counters (read, parse, map, rewrite, cleanup, serialize, write) for each mod",
+    )
+    pipeline.add_argument(
+        "--stats-json", metavar="PATH",
+        help="write the per-phase timings and counters of every mod to a JSON report",
+    )
+    pipeline.add_argument(
+        "--profile", action="store_true",
+        help=f"profile the run with cProfile and write {PROFILE_FILE_NAME}.pstats and .txt into the mod root",
+    )
+    pipeline.add_argument(
+        "--trace-memory", action="store_true",
+        help="trace allocations with tracemalloc around i3d parsing and XML rewriting and log the top sites",
+    )
+    pipeline.add_argument(
+        "--top", type=int, default=25, metavar="N",
+        help="entries shown in the --profile and --trace-memory reports (default 25)",
+    )
+    pipeline.add_argument(
+        "-j", "--jobs", type=int, default=1, metavar="N",
+        help="process i3d files of a modDesc, or the mods of a folder, in N worker processes (0 = one per CPU)",
+    )
+
+    writing = argparse.ArgumentParser(add_help=False)
+    writing.add_argument(
+        "--sidecar", action="store_true",
+        help=f"write a <name>.i3d{SIDECAR_SUFFIX} map next to each i3d (existing ones are always kept up to date)",
+    )
+    writing.set_defaults(diff=False)
+
+    map_parser = subparsers.add_parser(
+        "map", parents=[common, pipeline, writing],
+        help="map modDesc.xml, vehicle XML or mod zip files, or mods folders",
+    )
+    map_parser.add_argument(
+        "paths", nargs="+",
+        help="modDesc.xml, vehicle XML or mod zip files to process, or a folder to scan for mods",
+    )
+    batch_parser = subparsers.add_parser(
+        "batch", parents=[common, pipeline, writing], help="process every mod below one or more mods folders",
+    )
+    batch_parser.add_argument("paths", nargs="+", metavar="folder", help="folder to scan for mods")
+    check_parser = subparsers.add_parser(
+        "check", parents=[common, pipeline],
+        help="report what map would change, without writing any file",
+    )
+    check_parser.add_argument(
+        "paths", nargs="+", help="modDesc.xml, vehicle XML or mod zip files, or a folder to scan for mods",
+    )
+    check_parser.add_argument(
+        "--diff", action="store_true", help="also show the changes as a unified diff",
+    )
+    check_parser.set_defaults(sidecar=False)
+    watch_parser = subparsers.add_parser(
+        "watch", parents=[common, pipeline, writing],
+        help="map mods once, then remap vehicle XMLs whenever they or their i3d change",
+    )
+    watch_parser.add_argument("paths", nargs="+", help="modDesc.xml files, or a folder to scan for mods")
+    watch_parser.add_argument(
+        "--interval", type=float, default=1.0, metavar="SECONDS", help="time between two polls (default 1)",
+    )
+    watch_parser.add_argument(
+        "--debounce", type=float, default=2.0, metavar="SECONDS",
+        help="wait until files have not changed for this long before remapping (default 2)",
+    )
+    subparsers.add_parser(
+        "bench", add_help=False, help="run benchmarks/run_benchmarks.py; all further arguments are passed on",
+    )
+
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != "bench":
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.bench_args = extra
+    args.implicit = implicit
+    return args
+
+
+def pause(args):
+    """Wait for Enter when the script was started by drag and drop in an interactive console."""
+    if not args.implicit or getattr(args, "no_pause", False) or not sys.stdin.isatty():
+        return
+    try:
+        input("\nPress Enter to exit...")
+    except EOFError:
+        pass
 
-    banner = r"""
+
+BANNER = r"""
 ***********************************************
 *         Developed by GamerDesigns            *
 *              as part of RMC                  *
@@ -408,13 +3264,161 @@ if __name__ == "__main__":
 *   https://www.patreon.com/roughneckmoddingcrew *
 ***********************************************
 """
-    print(banner)
-    if LOG_FILE_PATH:
-        with open(LOG_FILE_PATH, "a", encoding="utf-8") as f:
-            f.write(banner + "\n")
+
+
+def run_bench(args) -> int:
+    bench_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+    if not os.path.isfile(os.path.join(bench_dir, "run_benchmarks.py")):
+        print(f"❌ Benchmarks not found: {bench_dir}")
+        return EXIT_USAGE
+    sys.path.insert(0, bench_dir)
+    import run_benchmarks
+    return run_benchmarks.main(args.bench_args)
+
+
+def watched_moddescs(paths):
+    """Return the modDesc.xml paths to watch for the given paths, or None after printing why there are none."""
+    moddesc_paths = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for found in find_mods(path):
+                if is_mod_zip(found):
+                    print(f"⏭️ Zipped mods are not watched: {found}")
+                else:
+                    moddesc_paths.append(found)
+        elif os.path.isfile(path) and os.path.basename(path).lower() == "moddesc.xml":
+            moddesc_paths.append(path)
+        else:
+            print(f"❌ Not a modDesc.xml or folder: {path}")
+            return None
+    if not moddesc_paths:
+        print("No mods found to watch.")
+        return None
+    return moddesc_paths
+
+
+def run_map(args) -> int:
+    """
+    Run the map, batch, check and watch commands and return the exit code.
+    watch maps its mods once and then hands them to a Watcher.
+    """
+    if args.command == "batch":
+        not_folders = [path for path in args.paths if not os.path.isdir(path)]
+        if not_folders:
+            print(f"❌ Not a folder: {', '.join(not_folders)}")
+            return EXIT_USAGE
+    if args.command == "watch":
+        moddesc_paths = watched_moddescs(args.paths)
+        if moddesc_paths is None:
+            return EXIT_USAGE
 
     try:
-        input("Press Enter to exit...")
-    except EOFError:
-        pass
+        mapper = Mapper(use_cache=not args.no_cache, sidecar=args.sidecar, jobs=args.jobs, backend=args.backend,
+                        quiet=args.quiet, stats=args.stats, top=args.top, dry_run=args.command == "check",
+                        diff=args.diff)
+    except ImportError:
+        print(f"❌ The {args.backend} backend is not available. Install lxml or use --backend stdlib.")
+        return EXIT_USAGE
+
+    processed_any = False
+    failed = 0
+    pending = 0
+
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if args.trace_memory:
+        if args.jobs != 1:
+            print("⚠️ --trace-memory only sees work done in this process; use -j 1 for complete data.")
+        tracemalloc.start()
+
+    try:
+        for input_path in args.paths:
+            input_path = os.path.abspath(input_path)
+
+            if os.path.isdir(input_path):
+                mod_results = mapper.process_folder(input_path)
+            elif is_mod_zip(input_path) and os.path.isfile(input_path):
+                mod_results = [mapper.process_mod(input_path)]
+            elif not os.path.isfile(input_path):
+                print(f"❌ File not found: {input_path}")
+                failed += 1
+                continue
+            elif os.path.basename(input_path).lower() == "moddesc.xml":
+                mod_results = [mapper.process_mod(input_path)]
+            else:
+                group_result = mapper.process_vehicle_xml(input_path)
+                failed += len(group_result.failed)
+                pending += len(group_result.updated)
+                processed_any = True
+                continue
+
+            failed += sum(result.failed for result in mod_results)
+            pending += sum(result.updated for result in mod_results)
+            processed_any = True
+
+        if args.command == "watch":
+            mapper.flush()
+            Watcher(mapper, moddesc_paths, args.interval, args.debounce).run()
+
+        if profiler:
+            profiler.disable()
+            first_path = os.path.abspath(args.paths[0])
+            if os.path.isdir(first_path):
+                profile_dir = first_path
+            elif is_mod_zip(first_path):
+                profile_dir = os.path.dirname(first_path)
+            else:
+                profile_dir = find_mod_root(first_path)
+            for path in write_profile(profiler, profile_dir, args.top):
+                print(f"🔬 Profile written: {path}")
+
+        mapper.close(BANNER + "\n")
+    finally:
+        if profiler:
+            profiler.disable()
+        mapper.close()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    if args.stats_json and mapper.reports:
+        write_stats_report(args.stats_json, mapper.reports)
+        print(f"📈 Stats report written: {args.stats_json}")
+
+    if not processed_any:
+        print("No valid XML files processed.")
+        return EXIT_USAGE
+
+    if mapper.dry_run:
+        print(f"📝 {pending} vehicle XML(s) would be updated.")
+    elif not args.quiet:
+        print(BANNER)
+    if failed or mapper.errors:
+        return EXIT_ERRORS
+    return EXIT_CHANGES if mapper.dry_run and pending else EXIT_OK
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
 
+    if args.command is None:
+        print("Drag and drop one or more XML files onto this script.")
+        print("Usage:")
+        print("  python rmc_i3d_mapper.py <file1.xml> <file2.xml> ...")
+        print("  python rmc_i3d_mapper.py {map,check,batch,watch,bench} --help")
+        args.implicit = True
+        pause(args)
+        return EXIT_USAGE
+
+    if args.command == "bench":
+        return run_bench(args)
+    exit_code = run_map(args)
+    pause(args)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())